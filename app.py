@@ -1,17 +1,22 @@
+import hashlib
+import os
+import threading
+import uuid
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.io import write_image
-import plotly.io as pio
-
-# Ensure that the kaleido package is installed for exporting charts
-# You can install it using: pip install kaleido
-pio.kaleido.scope.default_format = "png"
-
-from github_data import collect_github_data
-from metrics_calculation import calculate_metrics
-from metrics_csv import export_all_metrics
+from collections import OrderedDict
+from datetime import date, datetime, time, timezone
+from github_data import collect_github_data, listing_cache_key, ProfileCache, MAX_SUBRESOURCE_WORKERS
+from github_cache import GithubCache
+from rate_limit import RateLimitScheduler, tokens_from_config
+from metrics_calculation import calculate_metrics, calculate_metrics_incrementally, GRANULARITIES
+from metrics_history import append_snapshot, metric_trend, TREND_METRICS
+from metrics_csv import (export_all_metrics, export_metrics_columnar, latest_snapshot, load_metrics, read_manifest,
+                         COLUMNAR_EXPORT_PATH, MANIFEST_NAME)
 from charts import (
+    cached_chart,
+    export_figures,
+    zip_files,
     plot_language_distribution,
     plot_commit_frequency,
     plot_pull_request_merge_rate,
@@ -19,339 +24,605 @@ from charts import (
     plot_contributor_activity,
     plot_top_issues_by_comments,
     plot_average_pull_request_review_time,
-    plot_average_issue_age
+    plot_average_issue_age,
+    plot_metric_trend
 )
-from query_module import handle_user_query  # Import the query handling function
+from query_module import QueryResultCache, cached_user_query  # Import the query handling functions
 import comparison
 
+@st.cache_resource
+def get_github_cache():
+    # One cache connection shared by every session of this server
+    return GithubCache()
+
+@st.cache_resource
+def get_profile_cache():
+    # Owner profiles shared by every session for a few minutes, so comparisons do not refetch them
+    return ProfileCache()
+
+@st.cache_resource
+def get_query_cache():
+    # Answered queries shared by every session; entries are keyed by the version of the metrics
+    return QueryResultCache()
+
+@st.cache_resource
+def get_metrics_states():
+    # Incremental aggregates by (repository, listing key), kept live next to the shared GitHub cache
+    # so a sync only folds its delta into them
+    return {}, threading.Lock()
+
+@st.cache_resource
+def get_rate_limit_scheduler(tokens):
+    # Shared by every session using the same tokens so they are paced together
+    return RateLimitScheduler(list(tokens))
+
+MAX_SESSION_DATASETS = 3  # Fetched datasets kept per browser session
+COMMIT_CHART_WIDTH = 800  # Pixels; the commit series is downsampled to about one point per pixel
+
+def dataset_key(repo_url, tokens, fetch_params):
+    # Tokens are only kept as a hash so they never end up in session state
+    token_hash = hashlib.sha256('\n'.join(tokens).encode()).hexdigest()
+    return repo_url, token_hash, tuple(sorted(fetch_params.items()))
+
+def drop_dataset(datasets, key):
+    # Query results computed from a dataset go with it
+    entry = datasets.pop(key, None)
+    if entry is not None:
+        get_query_cache().invalidate(entry['version'])
+
+def cached_figure(figures, name, build):
+    # Figures are built once per dataset and reused on every rerun
+    if name not in figures:
+        figures[name] = build()
+    return figures[name]
+
+def fetch_dashboard_entry(repo_url, tokens, fetch_params):
+    scheduler = get_rate_limit_scheduler(tuple(tokens)) if tokens else None
+    history_since = fetch_params['history_since']
+    max_items = fetch_params['max_items'] or None
+    since = datetime.combine(date.fromisoformat(history_since), time.min, timezone.utc) if history_since else None
+    # Fetch data from GitHub
+    data = collect_github_data(repo_url, tokens[0] if tokens else None,
+                               compare_logins=fetch_params['compare_logins'],
+                               profile_cache=get_profile_cache(),
+                               max_subresource_workers=fetch_params['max_pr_workers'],
+                               cache=get_github_cache() if fetch_params['use_cache'] else None,
+                               incremental=fetch_params['incremental'],
+                               per_page=fetch_params['per_page'],
+                               max_items=max_items,
+                               since=since,
+                               scheduler=scheduler,
+                               pull_requests_from_issue_listing=fetch_params['pull_requests_from_issue_listing'])
+    if not data:
+        return None
+    if scheduler is not None:
+        st.caption("Remaining API quota per token: " + ", ".join(
+            f"...{suffix} {remaining if remaining is not None else '?'}/{limit or '?'}"
+            for suffix, remaining, limit, _ in scheduler.status()))
+
+    if len(data['profiles']) > 1:
+        # One column per fetched profile, the repository owner first
+        comparison_df = comparison.generate_profiles_comparison_dataframe(data['profiles'])
+        comparison_chart = comparison.plot_comparison_bar_chart(comparison_df)
+        data['comparison_results'] = comparison_chart  # Add comparison results to data
+
+    # Calculate Metrics
+    if data.get('delta') is not None:
+        # Incremental sync: update the stored aggregates from the delta
+        # instead of recomputing them from the whole history
+        # The aggregates follow the cached listings, which are kept apart per fetch limits
+        states, lock = get_metrics_states()
+        state_key = (repo_url, listing_cache_key('metrics_state', max_items=max_items, since=since))
+        with lock:
+            metrics, states[state_key] = calculate_metrics_incrementally(data, states.get(state_key))
+    else:
+        metrics = calculate_metrics(data)
+    # Every complete fetch adds a snapshot to the repository's history for trend charts; a listing
+    # that failed would be recorded as a drop in commits, pull requests or issues
+    if data['fetch_errors']:
+        print(f"Not recording a metrics snapshot, {', '.join(data['fetch_errors'])} could not be fetched")
+    else:
+        try:
+            append_snapshot(metrics, repo_url)
+        except Exception as e:
+            print(f"Could not record metrics snapshot: {e}")
+    return {'repo': repo_url, 'data': data, 'metrics': metrics, 'figures': {}, 'version': uuid.uuid4().hex}
+
+def load_dashboard_entry(export_path):
+    # Metrics rebuilt from an export; there is no raw GitHub data behind them
+    metrics = load_metrics(export_path)
+    snapshot = latest_snapshot(export_path)
+    repo = export_path
+    if os.path.exists(os.path.join(snapshot, MANIFEST_NAME)):
+        repo = read_manifest(snapshot)['repo']
+    data = {
+        'repo_info': {'name': repo, 'description': f"Loaded from exported metrics in '{snapshot}'",
+                      'url': f"https://github.com/{repo}", 'stars': 'N/A', 'forks': 'N/A', 'watchers': 'N/A',
+                      'language': 'N/A'},
+        'languages': {},
+        'pull_requests': [],
+        'issues': [],
+        'owner_profile': None,
+        'second_owner_profile': None,
+        'profiles': {},
+    }
+    return {'repo': repo, 'data': data, 'metrics': metrics, 'figures': {}, 'version': uuid.uuid4().hex}
+
+def render_language_and_commit_charts(data, metrics, figures):
+    # Repository Languages and Metrics
+    languages = data['languages']
+    
+    # Define columns for charts and descriptions
+    col1, col2 = st.columns([1, 2])  # Adjust column widths if needed
+
+    # Language Distribution Chart
+    with col1:
+        st.write("### Repository Language Distribution")
+        if languages:
+            lang_df = pd.DataFrame(list(languages.items()), columns=['Language', 'Bytes'])
+            fig_languages = cached_figure(figures, 'languages',
+                                          lambda: cached_chart('languages', plot_language_distribution, lang_df))
+            st.plotly_chart(fig_languages, use_container_width=True)
+        else:
+            st.write("No language data available.")
+
+    # Commit Frequency Chart
+    with col2:
+        st.write("### Commit Frequency")
+        commit_cube = metrics.get('commit_cube')
+        daily_commits = commit_cube.totals['day'] if commit_cube is not None else pd.Series()
+        if not daily_commits.empty:
+            start_date = st.date_input("Start Date", daily_commits.index.min().date())
+            end_date = st.date_input("End Date", daily_commits.index.max().date())
+            granularity = st.selectbox("Granularity", list(GRANULARITIES))
+            author = st.selectbox("Author", [None] + commit_cube.authors,
+                                  format_func=lambda author: "All authors" if author is None else author)
+
+            # The cube is pre-aggregated, so a new range or granularity is only a slice. Downsampling
+            # runs on the selected range, so narrowing the dates brings back full detail
+            filtered_df = commit_cube.series(granularity, start_date, end_date, author)
+            if not filtered_df.empty:
+                fig_commits = cached_figure(figures, ('commit_frequency', start_date, end_date, granularity, author,
+                                                      COMMIT_CHART_WIDTH),
+                                            lambda: cached_chart('commit_frequency', plot_commit_frequency, filtered_df,
+                                                                 max_points=COMMIT_CHART_WIDTH))
+                st.plotly_chart(fig_commits, use_container_width=True)
+            else:
+                st.write("No commit frequency data available for the selected date range.")
+        else:
+            st.write("No commit frequency data available.")
+
+def render_merge_rate_and_resolution_charts(metrics, figures):
+    col1, col2 = st.columns([1, 2])
+
+    # Pull Request Merge Rate Chart
+    with col1:
+        st.write("### Pull Request Merge Rate")
+        merge_rate = metrics.get('pr_merge_rate', {})
+        fig_merge_rate = cached_figure(figures, 'pr_merge_rate',
+                                       lambda: cached_chart('pr_merge_rate', plot_pull_request_merge_rate, merge_rate))
+        st.plotly_chart(fig_merge_rate, use_container_width=True)
+
+    # Average Issue Resolution Time Gauge
+    with col2:
+        st.write("### Average Issue Resolution Time")
+        avg_issue_resolution_time = metrics.get('issue_resolution_time', 0)
+        fig_issue_resolution_time = cached_figure(figures, 'issue_resolution_time',
+                                                  lambda: cached_chart('issue_resolution_time', plot_average_issue_resolution_time,
+                                                                       avg_issue_resolution_time))
+        st.plotly_chart(fig_issue_resolution_time, use_container_width=True)
+
+def render_contributor_and_issue_charts(metrics, figures):
+    # Contributor Activity and Top Issues
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        st.write("### Contributor Activity")
+        contributor_activity_df = metrics.get('contributor_activity', pd.DataFrame())
+        if not contributor_activity_df.empty:
+            fig_contributor_activity = cached_figure(figures, 'contributor_activity',
+                                                     lambda: cached_chart('contributor_activity', plot_contributor_activity,
+                                                                      contributor_activity_df))
+            st.plotly_chart(fig_contributor_activity, use_container_width=True)
+        else:
+            st.write("No contributor activity data available.")
+
+    with col2:
+        st.write("### Top Issues by Comments")
+        top_issues_df = metrics.get('top_issues', pd.DataFrame())
+        if not top_issues_df.empty and {'title', 'comments'}.issubset(top_issues_df.columns):
+            fig_top_issues = cached_figure(figures, 'top_issues',
+                                           lambda: cached_chart('top_issues', plot_top_issues_by_comments, top_issues_df))
+            st.plotly_chart(fig_top_issues, use_container_width=True)
+        else:
+            st.write("No top issues data available.")
+
+def render_review_time_and_age_charts(metrics, figures):
+    # Average PR Review Time and Issue Age
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        st.write("### Average Pull Request Review Time")
+        avg_pr_review_time = metrics.get('pr_review_time', 0)
+        fig_pr_review_time = cached_figure(figures, 'pr_review_time',
+                                           lambda: cached_chart('pr_review_time', plot_average_pull_request_review_time,
+                                                                avg_pr_review_time))
+        st.plotly_chart(fig_pr_review_time, use_container_width=True)
+
+    with col2:
+        st.write("### Average Issue Age")
+        avg_issue_age = metrics.get('issue_age', 0)
+        fig_issue_age = cached_figure(figures, 'issue_age',
+                                      lambda: cached_chart('issue_age', plot_average_issue_age, avg_issue_age))
+        st.plotly_chart(fig_issue_age, use_container_width=True)
+
+def pull_request_table(pull_requests, pr_states):
+    pr_data = []
+    for pr in pull_requests:
+        # Filter PRs based on selected states
+        if 'all' in pr_states or pr.state in pr_states:
+            pr_data.append({
+                "Title": pr.title,
+                "State": pr.state,
+                "Created At": pr.created_at,
+                "Reviews Count": len(pr.reviews)
+            })
+    return pd.DataFrame(pr_data)
+
+def issue_table(issues, issue_labels):
+    issue_data = []
+    for issue in issues:
+        # Filter issues based on selected labels
+        if not issue_labels or any(label in issue_labels for label in issue.labels):
+            issue_data.append({
+                "Title": issue.title,
+                "State": issue.state,
+                "Created At": issue.created_at,
+                "Comments": issue.comments
+            })
+    return pd.DataFrame(issue_data)
+
+def render_history(repo):
+    metric = st.selectbox("Metric", TREND_METRICS, index=TREND_METRICS.index('pr_review_time'))
+    weeks = st.slider("Weeks of history", min_value=1, max_value=104, value=12)
+    # Only the history parts overlapping the window are read
+    trend = metric_trend(repo, metric, weeks=weeks)
+    if not trend.empty:
+        st.plotly_chart(plot_metric_trend(trend, metric.replace('_', ' ').title()), use_container_width=True)
+    else:
+        st.write("No snapshots recorded for this window yet; every fetch records one.")
+
+def render_details(data, figures, pr_states, issue_labels):
+    # Tables are only built while their expander is open
+    # Pull Requests with Code Reviews
+    pr_expander = st.expander("Pull Request Details", key='pull_request_details', on_change='rerun')
+    with pr_expander:
+        if pr_expander.open:
+            pr_df = cached_figure(figures, ('pull_request_table', tuple(pr_states)),
+                                  lambda: pull_request_table(data.get('pull_requests', []), pr_states))
+            if not pr_df.empty:
+                st.dataframe(pr_df)
+            else:
+                st.write("No pull requests found.")
+
+    # Issues with Details
+    issue_expander = st.expander("Issue Details", key='issue_details', on_change='rerun')
+    with issue_expander:
+        if issue_expander.open:
+            issue_df = cached_figure(figures, ('issue_table', tuple(issue_labels)),
+                                     lambda: issue_table(data.get('issues', []), issue_labels))
+            if not issue_df.empty:
+                st.dataframe(issue_df)
+            else:
+                st.write("No issues found.")
+
+def render_profile_card(profile):
+    st.markdown(f"**Username:** {profile.get('login', 'N/A')}")
+    st.markdown(f"**Name:** {profile.get('name', 'N/A')}")
+    st.markdown(f"**Bio:** {profile.get('bio', 'N/A')}")
+    st.markdown(f"**Location:** {profile.get('location', 'N/A')}")
+    st.markdown(f"**Company:** {profile.get('company', 'N/A')}")
+    st.markdown(f"**Email:** {profile.get('email', 'N/A')}")
+    st.markdown(f"**Public Repos:** {profile.get('public_repos', 0)}")
+    st.markdown(f"**Followers:** {profile.get('followers', 0)}")
+    st.markdown(f"**Following:** {profile.get('following', 0)}")
+    st.markdown(f"**Created At:** {profile.get('created_at', 'N/A')}")
+    st.markdown(f"**Updated At:** {profile.get('updated_at', 'N/A')}")
+    st.markdown(f"**Profile URL:** [Profile Link](https://github.com/{profile.get('login', 'N/A')})")
+
+def render_profiles(data):
+    # Profile Information
+    st.markdown(
+        """
+        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
+            <h2 style="text-align: center; margin: 0;">Profile Information</h2>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    # The repository owner first, then every compared profile in its own column
+    profiles = list((data.get('profiles') or {}).values()) or [data.get('owner_profile')]
+    profile_columns = st.columns(max(2, len(profiles)))
+    for i, (profile_column, profile) in enumerate(zip(profile_columns, profiles)):
+        with profile_column:
+            st.markdown("**Primary Owner Profile:**" if i == 0 else f"**Compared Profile {i}:**")
+            render_profile_card(profile or {})
+    if len(profiles) < 2:
+        with profile_columns[1]:
+            st.markdown("**Compared Profiles:**")
+            st.markdown("No compared profiles available.")
+    st.markdown(
+        """
+        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px; margin-top: 20px;">
+            <h2 style="text-align: center; margin: 0;">Comparison Results</h2>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    comparison_chart = data.get('comparison_results')
+    if comparison_chart:
+        st.write("### Metrics Comparison")
+        st.plotly_chart(comparison_chart, use_container_width=True)
+        
+    else:
+     st.write("No comparison data available.")
+
+def dashboard_figures(data, metrics, figures):
+    # Every chart of the dashboard over the full data, reusing whatever the panels already built
+    builders = {}
+    languages = data.get('languages')
+    if languages:
+        lang_df = pd.DataFrame(list(languages.items()), columns=['Language', 'Bytes'])
+        builders['language_distribution_chart'] = (
+            'languages', lambda: cached_chart('languages', plot_language_distribution, lang_df))
+    commit_cube = metrics.get('commit_cube')
+    if commit_cube is not None and not commit_cube.totals['day'].empty:
+        builders['commit_frequency_chart'] = (
+            ('commit_frequency', COMMIT_CHART_WIDTH),
+            lambda: cached_chart('commit_frequency', plot_commit_frequency, commit_cube.totals['day'],
+                                 max_points=COMMIT_CHART_WIDTH))
+    builders['pr_merge_rate_chart'] = (
+        'pr_merge_rate',
+        lambda: cached_chart('pr_merge_rate', plot_pull_request_merge_rate, metrics.get('pr_merge_rate', {})))
+    builders['issue_resolution_time_gauge'] = (
+        'issue_resolution_time',
+        lambda: cached_chart('issue_resolution_time', plot_average_issue_resolution_time,
+                             metrics.get('issue_resolution_time', 0)))
+    contributor_activity_df = metrics.get('contributor_activity', pd.DataFrame())
+    if not contributor_activity_df.empty:
+        builders['contributor_activity_chart'] = (
+            'contributor_activity',
+            lambda: cached_chart('contributor_activity', plot_contributor_activity, contributor_activity_df))
+    top_issues_df = metrics.get('top_issues', pd.DataFrame())
+    if not top_issues_df.empty and {'title', 'comments'}.issubset(top_issues_df.columns):
+        builders['top_issues_chart'] = (
+            'top_issues', lambda: cached_chart('top_issues', plot_top_issues_by_comments, top_issues_df))
+    builders['pr_review_time_gauge'] = (
+        'pr_review_time',
+        lambda: cached_chart('pr_review_time', plot_average_pull_request_review_time, metrics.get('pr_review_time', 0)))
+    builders['issue_age_gauge'] = (
+        'issue_age', lambda: cached_chart('issue_age', plot_average_issue_age, metrics.get('issue_age', 0)))
+    if data.get('comparison_results'):
+        builders['profile_comparison_chart'] = ('comparison', lambda: data['comparison_results'])
+    return {name: cached_figure(figures, key, build) for name, (key, build) in builders.items()}
+
+def render_chart_export(entry):
+    # All charts are rendered in one batch so a full export pays for one renderer startup
+    st.subheader("Export Charts")
+    image_formats = st.multiselect("Image formats", ['png', 'svg'], default=['png'])
+    if st.button("Export All Charts") and image_formats:
+        with st.spinner("Rendering charts..."):
+            try:
+                paths = export_figures(dashboard_figures(entry['data'], entry['metrics'], entry['figures']),
+                                       formats=image_formats)
+                entry['chart_export'] = (os.path.dirname(paths[0]), zip_files(paths))
+            except Exception as e:
+                st.error(f"Error exporting charts: {e}")
+    if entry.get('chart_export'):
+        directory, archive = entry['chart_export']
+        st.success(f"Charts saved to '{directory}'")
+        st.download_button("Download Charts (.zip)", archive, file_name=f"{os.path.basename(directory)}.zip",
+                           mime="application/zip")
+
+def render_dashboard(entry, pr_states, issue_labels):
+    data = entry['data']
+    metrics = entry['metrics']
+    figures = entry['figures']
+    for source, error in data.get('fetch_errors', {}).items():
+        st.warning(f"Could not fetch {source}: {error}")
+    fetch_timings = data.get('fetch_timings', {})
+    if fetch_timings:
+        st.caption("Fetch time per source: " + ", ".join(
+            f"{source} {seconds:.2f}s" for source, seconds in fetch_timings.items()))
+
+    # Repository Information Box
+    st.markdown(
+        """
+        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
+            <h2 style="text-align: center; margin: 0;">Repository Information</h2>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    # Display repository information
+    repo_info = data['repo_info']
+    st.markdown(f"**Name:** {repo_info['name']}")
+    st.markdown(f"**Description:** {repo_info['description']}")
+    st.markdown(f"**URL:** [Repository Link]({repo_info['url']})")
+    st.markdown(f"**Stars:** {repo_info['stars']}")
+    st.markdown(f"**Forks:** {repo_info['forks']}")
+    st.markdown(f"**Watchers:** {repo_info['watchers']}")
+    st.markdown(f"**Primary Language:** {repo_info['language']}")
+
+    # Alerts and Insights
+    avg_pr_review_time = metrics.get('pr_review_time', 0)
+    if avg_pr_review_time > 20:
+        st.warning(f"⚠️ The average PR review time is {avg_pr_review_time:.2f} days, which is higher than the recommended threshold!")
+
+    avg_issue_resolution_time = metrics.get('issue_resolution_time', 0)
+    if avg_issue_resolution_time > 30:
+        st.warning(f"⚠️ The average issue resolution time is {avg_issue_resolution_time:.2f} days, which is higher than the recommended threshold!")
+
+    # Repository Languages and Metrics Box
+    st.markdown(
+        """
+        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
+            <h2 style="text-align: center; margin: 0;">Metrics</h2>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    with st.container():
+        st.markdown(
+"""
+<div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
+<h3>Calculated Metrices</h3>
+<ul style="list-style-type: none; padding: 0; font-size: 18px;">
+<li><strong>Commit Frequency</strong>: Shows the number of commits made on a daily basis.</li>
+<li><strong>PR Merge Rate</strong>: Represents the ratio of merged pull requests to total pull requests.</li>
+<li><strong>Issue Resolution Time</strong>: Indicates the average time taken to resolve issues.</li>
+<li><strong>Contributor Activity</strong>: Displays the activity level of contributors based on commit counts.</li>
+<li><strong>Top Issues</strong>: Lists the issues with the most comments.</li>
+<li><strong>PR Review Time</strong>: Measures the average time taken to review and merge pull requests.</li>
+<li><strong>Issue Age</strong>: Shows the average age of issues from creation to closure.</li>
+</ul>
+</div>
+""",
+unsafe_allow_html=True
+)
+
+    # Every panel is built only while its tab is selected, and the figures it
+    # builds are kept in the session entry for later reruns
+    panels = {
+        "Languages & Commits": lambda: render_language_and_commit_charts(data, metrics, figures),
+        "Merge Rate & Resolution": lambda: render_merge_rate_and_resolution_charts(metrics, figures),
+        "Contributors & Top Issues": lambda: render_contributor_and_issue_charts(metrics, figures),
+        "Review Time & Issue Age": lambda: render_review_time_and_age_charts(metrics, figures),
+        "Details": lambda: render_details(data, figures, pr_states, issue_labels),
+        "History": lambda: render_history(entry['repo']),
+        "Profiles & Comparison": lambda: render_profiles(data),
+    }
+    tabs = st.tabs(list(panels), key='dashboard_tab', on_change='rerun')
+    for tab, render_panel in zip(tabs, panels.values()):
+        with tab:
+            if tab.open:
+                render_panel()
+
+    render_chart_export(entry)
+
+    # Export metrics to CSV with custom path if provided
+    st.subheader("Export Metrics")
+    export_format = st.selectbox("Export format", ['csv', 'parquet', 'feather'])
+    custom_path="C:\\Users\\donaa\\OneDrive\\Desktop\\surspa2\\csv"
+    if st.button("Export Metrics"):
+        if export_format != 'csv':
+            # Columnar tables partitioned by repository and snapshot date, with a manifest
+            directory = export_metrics_columnar(metrics, entry['repo'], root=COLUMNAR_EXPORT_PATH,
+                                                file_format=export_format)
+            st.success(f"Metrics exported to '{directory}'")
+        else:
+            if custom_path:
+                export_all_metrics(metrics, file_path=custom_path)
+            else:
+                export_all_metrics(metrics)  # Default path (current directory)
+            st.success("Metrics exported successfully!")
+
 def main():
     st.set_page_config(layout="wide")
     st.title("Developer Performance Analytics Dashboard")
 
     # Sidebar inputs
+    data_source = st.sidebar.radio("Data source", ["GitHub API", "Exported metrics"], horizontal=True)
+    if data_source == "Exported metrics":
+        export_path = st.sidebar.text_input("Export directory (CSV files or a columnar export):", "csv")
+
     st.sidebar.header("Repository Information")
     repo_url = st.sidebar.text_input("Enter GitHub repository URL (owner/repo):", "octocat/Hello-World")
     token = st.sidebar.text_input("Enter your GitHub token:", type="password")
-    second_owner_login = st.sidebar.text_input("Enter secondary owner's GitHub login (optional):", "")
+    extra_tokens = st.sidebar.text_area("Additional GitHub tokens to rotate through (one per line, optional):", "")
+    compare_logins = st.sidebar.text_input("GitHub logins to compare with the owner (optional, comma-separated):", "")
+    compare_logins = tuple(login.strip() for login in compare_logins.split(',') if login.strip())
+    max_pr_workers = st.sidebar.number_input("Max concurrent pull request requests", min_value=1, max_value=32,
+                                             value=MAX_SUBRESOURCE_WORKERS)
+    use_cache = st.sidebar.checkbox("Use local cache (conditional requests)", value=True)
+    pull_requests_from_issue_listing = st.sidebar.checkbox(
+        "Read pull requests from the issues listing", value=True,
+        help="The issues listing already returns every pull request, so the pulls listing is skipped")
+    per_page = st.sidebar.slider("Items per API page", min_value=10, max_value=100, value=100, step=10)
+    max_items = st.sidebar.number_input("Max items per listing (0 for full history)", min_value=0, value=0, step=100)
+    history_since = st.sidebar.date_input("Only fetch history since (optional)", value=None)
+    incremental = st.sidebar.checkbox("Incremental sync (only fetch changes since last fetch)", value=False,
+                                      disabled=not use_cache)
+    if st.sidebar.button("Clear local cache"):
+        get_github_cache().clear(repo_url)
+        st.sidebar.success(f"Cleared cached data for {repo_url}")
 
     st.sidebar.header("Filters")
     pr_states = st.sidebar.multiselect("Filter Pull Requests by State", ['open', 'closed', 'all'], default=['all'])
     issue_labels = st.sidebar.multiselect("Filter Issues by Label", [])
 
-    if st.sidebar.button("Fetch Data"):
-        with st.spinner("Fetching data..."):
-            try:
-                # Fetch data from GitHub
-                data = collect_github_data(repo_url, token, second_owner_login)
-                if data:
-                    st.success("Data successfully fetched!")
-
-                    if second_owner_login:
-                        primary_profile = data['owner_profile']
-                        secondary_profile = data['second_owner_profile']
-                        comparison_df = comparison.generate_comparison_dataframe(primary_profile, secondary_profile)
-                        comparison_chart = comparison.plot_comparison_bar_chart(comparison_df)
-                        data['comparison_results'] = comparison_chart  # Add comparison results to data 
-
-                    # Calculate Metrics and Visualizations
-                    metrics = calculate_metrics(data)
-                    st.session_state.metrics = metrics
-                    # Repository Information Box
-                    st.markdown(
-                        """
-                        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
-                            <h2 style="text-align: center; margin: 0;">Repository Information</h2>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-                    # Display repository information
-                    repo_info = data['repo_info']
-                    st.markdown(f"**Name:** {repo_info['name']}")
-                    st.markdown(f"**Description:** {repo_info['description']}")
-                    st.markdown(f"**URL:** [Repository Link]({repo_info['url']})")
-                    st.markdown(f"**Stars:** {repo_info['stars']}")
-                    st.markdown(f"**Forks:** {repo_info['forks']}")
-                    st.markdown(f"**Watchers:** {repo_info['watchers']}")
-                    st.markdown(f"**Primary Language:** {repo_info['language']}")
-
-                    # Alerts and Insights
-                    avg_pr_review_time = metrics.get('pr_review_time', 0)
-                    if avg_pr_review_time > 20:
-                        st.warning(f"⚠️ The average PR review time is {avg_pr_review_time:.2f} days, which is higher than the recommended threshold!")
-
-                    avg_issue_resolution_time = metrics.get('issue_resolution_time', 0)
-                    if avg_issue_resolution_time > 30:
-                        st.warning(f"⚠️ The average issue resolution time is {avg_issue_resolution_time:.2f} days, which is higher than the recommended threshold!")
-
-                    # Repository Languages and Metrics Box
-                    st.markdown(
-                        """
-                        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
-                            <h2 style="text-align: center; margin: 0;">Metrics</h2>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-                    with st.container():
-                        st.markdown(
-    """
-    <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
-        <h3>Calculated Metrices</h3>
-        <ul style="list-style-type: none; padding: 0; font-size: 18px;">
-            <li><strong>Commit Frequency</strong>: Shows the number of commits made on a daily basis.</li>
-            <li><strong>PR Merge Rate</strong>: Represents the ratio of merged pull requests to total pull requests.</li>
-            <li><strong>Issue Resolution Time</strong>: Indicates the average time taken to resolve issues.</li>
-            <li><strong>Contributor Activity</strong>: Displays the activity level of contributors based on commit counts.</li>
-            <li><strong>Top Issues</strong>: Lists the issues with the most comments.</li>
-            <li><strong>PR Review Time</strong>: Measures the average time taken to review and merge pull requests.</li>
-            <li><strong>Issue Age</strong>: Shows the average age of issues from creation to closure.</li>
-        </ul>
-    </div>
-    """,
-    unsafe_allow_html=True
-)
-                        
-                 
-                    # Repository Languages and Metrics
-                    languages = data['languages']
-                    
-                    # Define columns for charts and descriptions
-                    col1, col2 = st.columns([1, 2])  # Adjust column widths if needed
-
-                    # Language Distribution Chart
-                    with col1:
-                        st.write("### Repository Language Distribution")
-                        if languages:
-                            lang_df = pd.DataFrame(list(languages.items()), columns=['Language', 'Bytes'])
-                            fig_languages = plot_language_distribution(lang_df)
-                            st.plotly_chart(fig_languages, use_container_width=True)
-                            # Export button
-                            if st.button("Export Language Distribution Chart as PNG"):
-                                fig_languages.write_image("language_distribution_chart.png")
-                                st.success("Chart saved as language_distribution_chart.png")
-                        else:
-                            st.write("No language data available.")
-
-                    # Commit Frequency Chart
-                    with col2:
-                        st.write("### Commit Frequency")
-                        commit_frequency_df = metrics.get('commit_frequency', pd.DataFrame())
-                        if not commit_frequency_df.empty:
-                            if commit_frequency_df.index.tz is not None:
-                                commit_frequency_df.index = commit_frequency_df.index.tz_localize(None)
-
-                            start_date = st.date_input("Start Date", commit_frequency_df.index.min().date())
-                            end_date = st.date_input("End Date", commit_frequency_df.index.max().date())
-
-                            filtered_df = commit_frequency_df.loc[start_date:end_date]
-                            if not filtered_df.empty:
-                                fig_commits = plot_commit_frequency(filtered_df)
-                                st.plotly_chart(fig_commits, use_container_width=True)
-                                # Export button
-                                if st.button("Export Commit Frequency Chart as PNG"):
-                                    fig_commits.write_image("commit_frequency_chart.png")
-                                    st.success("Chart saved as commit_frequency_chart.png")
-                            else:
-                                st.write("No commit frequency data available for the selected date range.")
-                        else:
-                            st.write("No commit frequency data available.")
-
-                    # Next set of charts
-                    col1, col2 = st.columns([1, 2])  # Reuse columns
-
-                    # Pull Request Merge Rate Chart
-                    with col1:
-                        st.write("### Pull Request Merge Rate")
-                        merge_rate = metrics.get('pr_merge_rate', {})
-                        fig_merge_rate = plot_pull_request_merge_rate(merge_rate)
-                        st.plotly_chart(fig_merge_rate, use_container_width=True)
-                        # Export button
-                        if st.button("Export PR Merge Rate Chart as PNG"):
-                            fig_merge_rate.write_image("pr_merge_rate_chart.png")
-                            st.success("Chart saved as pr_merge_rate_chart.png")
-
-                    # Average Issue Resolution Time Gauge
-                    with col2:
-                        st.write("### Average Issue Resolution Time")
-                        avg_issue_resolution_time = metrics.get('issue_resolution_time', 0)
-                        fig_issue_resolution_time = plot_average_issue_resolution_time(avg_issue_resolution_time)
-                        st.plotly_chart(fig_issue_resolution_time, use_container_width=True)
-                        # Export button
-                        if st.button("Export Issue Resolution Time Gauge as PNG"):
-                            fig_issue_resolution_time.write_image("issue_resolution_time_gauge.png")
-                            st.success("Chart saved as issue_resolution_time_gauge.png")
-
-                    # Contributor Activity and Top Issues
-                    col1, col2 = st.columns([1, 2])
-
-                    with col1:
-                        st.write("### Contributor Activity")
-                        contributor_activity_df = metrics.get('contributor_activity', pd.DataFrame())
-                        if not contributor_activity_df.empty:
-                            fig_contributor_activity = plot_contributor_activity(contributor_activity_df)
-                            st.plotly_chart(fig_contributor_activity, use_container_width=True)
-                            # Export button
-                            if st.button("Export Contributor Activity Chart as PNG"):
-                                fig_contributor_activity.write_image("contributor_activity_chart.png")
-                                st.success("Chart saved as contributor_activity_chart.png")
-                        else:
-                            st.write("No contributor activity data available.")
-
-                    with col2:
-                        st.write("### Top Issues by Comments")
-                        top_issues_df = metrics.get('top_issues', pd.DataFrame())
-                        if not top_issues_df.empty and {'title', 'comments'}.issubset(top_issues_df.columns):
-                            fig_top_issues = plot_top_issues_by_comments(top_issues_df)
-                            st.plotly_chart(fig_top_issues, use_container_width=True)
-                            # Export button
-                            if st.button("Export Top Issues Chart as PNG"):
-                                fig_top_issues.write_image("top_issues_chart.png")
-                                st.success("Chart saved as top_issues_chart.png")
-                        else:
-                            st.write("No top issues data available.")
-
-                    # Average PR Review Time and Issue Age
-                    col1, col2 = st.columns([1, 2])
-
-                    with col1:
-                        st.write("### Average Pull Request Review Time")
-                        avg_pr_review_time = metrics.get('pr_review_time', 0)
-                        fig_pr_review_time = plot_average_pull_request_review_time(avg_pr_review_time)
-                        st.plotly_chart(fig_pr_review_time, use_container_width=True)
-                        # Export button
-                        if st.button("Export PR Review Time Gauge as PNG"):
-                            fig_pr_review_time.write_image("pr_review_time_gauge.png")
-                            st.success("Chart saved as pr_review_time_gauge.png")
-
-                    with col2:
-                        st.write("### Average Issue Age")
-                        avg_issue_age = metrics.get('issue_age', 0)
-                        fig_issue_age = plot_average_issue_age(avg_issue_age)
-                        st.plotly_chart(fig_issue_age, use_container_width=True)
-                        # Export button
-                        if st.button("Export Issue Age Gauge as PNG"):
-                            fig_issue_age.write_image("issue_age_gauge.png")
-                            st.success("Chart saved as issue_age_gauge.png")
-
-                    # Detailed Views using Expanders
-
-                    # Pull Requests with Code Reviews
-                    with st.expander("Pull Request Details"):
-                        pr_data = []
-                        for pr in data.get('pull_requests', []):
-                            # Filter PRs based on selected states
-                            if 'all' in pr_states or pr.state in pr_states:
-                                pr_data.append({
-                                    "Title": pr.title,
-                                    "State": pr.state,
-                                    "Created At": pr.created_at,
-                                    "Reviews Count": len(pr.reviews) if pr.reviews else 0
-                                })
-                        if pr_data:
-                            pr_df = pd.DataFrame(pr_data)
-                            st.dataframe(pr_df)
-                        else:
-                            st.write("No pull requests found.")
-
-                    # Issues with Details
-                    with st.expander("Issue Details"):
-                        issue_data = []
-                        for issue in data.get('issues', []):
-                            # Filter issues based on selected labels
-                            if not issue_labels or any(label.name in issue_labels for label in issue.labels):
-                                issue_data.append({
-                                    "Title": issue.title,
-                                    "State": issue.state,
-                                    "Created At": issue.created_at,
-                                    "Comments": issue.comments
-                                })
-                        if issue_data:
-                            issue_df = pd.DataFrame(issue_data)
-                            st.dataframe(issue_df)
-                        else:
-                            st.write("No issues found.")
-
-                    # Export metrics to CSV with custom path if provided
-                    st.subheader("Export Metrics to CSV")
-                    custom_path="C:\\Users\\donaa\\OneDrive\\Desktop\\surspa2\\csv"
-                    if st.button("Export Metrics"):
-                        if custom_path:
-                            export_all_metrics(metrics, file_path=custom_path)
-                        else:
-                            export_all_metrics(metrics)  # Default path (current directory)
-                        st.success("Metrics exported successfully!")
-
-                    # Profile Information
-                    st.markdown(
-                        """
-                        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px;">
-                            <h2 style="text-align: center; margin: 0;">Profile Information</h2>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-                    profile_col1, profile_col2 = st.columns(2)
-
-                    with profile_col1:
-                        st.markdown("**Primary Owner Profile:**")
-                        primary_owner_profile = data.get('owner_profile', {})
-                        st.markdown(f"**Username:** {primary_owner_profile.get('login', 'N/A')}")
-                        st.markdown(f"**Name:** {primary_owner_profile.get('name', 'N/A')}")
-                        st.markdown(f"**Bio:** {primary_owner_profile.get('bio', 'N/A')}")
-                        st.markdown(f"**Location:** {primary_owner_profile.get('location', 'N/A')}")
-                        st.markdown(f"**Company:** {primary_owner_profile.get('company', 'N/A')}")
-                        st.markdown(f"**Email:** {primary_owner_profile.get('email', 'N/A')}")
-                        st.markdown(f"**Public Repos:** {primary_owner_profile.get('public_repos', 0)}")
-                        st.markdown(f"**Followers:** {primary_owner_profile.get('followers', 0)}")
-                        st.markdown(f"**Following:** {primary_owner_profile.get('following', 0)}")
-                        st.markdown(f"**Created At:** {primary_owner_profile.get('created_at', 'N/A')}")
-                        st.markdown(f"**Updated At:** {primary_owner_profile.get('updated_at', 'N/A')}")
-                        st.markdown(f"**Profile URL:** [Profile Link](https://github.com/{primary_owner_profile.get('login', 'N/A')})")
-
-                    with profile_col2:
-                        secondary_owner_login = data.get('second_owner_profile', {}).get('login')
-                        if secondary_owner_login:
-                            st.markdown("**Secondary Owner Profile:**")
-                            secondary_owner_profile = data.get('second_owner_profile', {})
-                            st.markdown(f"**Username:** {secondary_owner_profile.get('login', 'N/A')}")
-                            st.markdown(f"**Name:** {secondary_owner_profile.get('name', 'N/A')}")
-                            st.markdown(f"**Bio:** {secondary_owner_profile.get('bio', 'N/A')}")
-                            st.markdown(f"**Location:** {secondary_owner_profile.get('location', 'N/A')}")
-                            st.markdown(f"**Company:** {secondary_owner_profile.get('company', 'N/A')}")
-                            st.markdown(f"**Email:** {secondary_owner_profile.get('email', 'N/A')}")
-                            st.markdown(f"**Public Repos:** {secondary_owner_profile.get('public_repos', 0)}")
-                            st.markdown(f"**Followers:** {secondary_owner_profile.get('followers', 0)}")
-                            st.markdown(f"**Following:** {secondary_owner_profile.get('following', 0)}")
-                            st.markdown(f"**Created At:** {secondary_owner_profile.get('created_at', 'N/A')}")
-                            st.markdown(f"**Updated At:** {secondary_owner_profile.get('updated_at', 'N/A')}")
-                            st.markdown(f"**Profile URL:** [Profile Link](https://github.com/{secondary_owner_profile.get('login', 'N/A')})")                      
-                        else:
-                                st.markdown("**Secondary Owner Profile:**")
-                                st.markdown("No secondary owner information available.")
-                    st.markdown(
-                        """
-                        <div style="border: 2px solid #d1d5db; border-radius: 5px; padding: 10px; margin-top: 20px;">
-                            <h2 style="text-align: center; margin: 0;">Comparison Results</h2>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-                    comparison_chart = data.get('comparison_results')
-                    if comparison_chart:
-                        st.write("### Metrics Comparison")
-                        st.plotly_chart(comparison_chart, use_container_width=True)
-                        
+    # Everything that changes what gets fetched; a different combination is a different dataset
+    fetch_params = {
+        'compare_logins': compare_logins,
+        'max_pr_workers': int(max_pr_workers),
+        'use_cache': use_cache,
+        'pull_requests_from_issue_listing': pull_requests_from_issue_listing,
+        'incremental': use_cache and incremental,
+        'per_page': per_page,
+        'max_items': int(max_items),
+        'history_since': history_since.isoformat() if history_since else None,
+    }
+    # Tokens from the sidebar come first, then GITHUB_TOKENS / GITHUB_TOKEN from the environment
+    tokens = tokens_from_config(token, *extra_tokens.splitlines())
+    if data_source == "Exported metrics":
+        # Dashboards from nightly exports need no token and make no API calls
+        key = ('export', os.path.abspath(export_path))
+        load_entry = lambda: load_dashboard_entry(export_path)
+    else:
+        key = dataset_key(repo_url, tokens, fetch_params)
+        load_entry = lambda: fetch_dashboard_entry(repo_url, tokens, fetch_params)
+    datasets = st.session_state.setdefault('datasets', OrderedDict())
+
+    fetch_clicked = st.sidebar.button("Fetch Data")
+    refresh_clicked = st.sidebar.button("Refresh Data", help="Fetch again even if this dataset is already loaded")
+    if st.sidebar.button("Clear session cache"):
+        for cached_key in list(datasets):
+            drop_dataset(datasets, cached_key)
+        st.session_state.pop('active_dataset', None)
+        st.session_state.pop('metrics', None)
+        st.session_state.pop('metrics_version', None)
+
+    if refresh_clicked:
+        drop_dataset(datasets, key)
+    if fetch_clicked or refresh_clicked:
+        if key in datasets:
+            datasets.move_to_end(key)
+            st.session_state.active_dataset = key
+        else:
+            with st.spinner("Fetching data..."):
+                try:
+                    entry = load_entry()
+                    if entry:
+                        st.success("Data successfully fetched!")
+                        datasets[key] = entry
+                        while len(datasets) > MAX_SESSION_DATASETS:
+                            drop_dataset(datasets, next(iter(datasets)))
+                        st.session_state.active_dataset = key
                     else:
-                     st.write("No comparison data available.")
-
-
-                else:
-                    st.error("Failed to fetch data. Please check your inputs and try again.")
-
-            except Exception as e:
-                st.error(f"Error fetching data: {e}")
-
+                        st.error("Failed to fetch data. Please check your inputs and try again.")
+                except Exception as e:
+                    st.error(f"Error fetching data: {e}")
+
+    # Render whatever was fetched last, so widget interaction (date filters,
+    # export buttons) reruns the script without fetching or recomputing
+    active_key = st.session_state.get('active_dataset')
+    entry = datasets.get(active_key)
+    if entry:
+        if active_key != key:
+            st.info("The sidebar inputs changed since this data was fetched. Press Fetch Data to load them.")
+        st.session_state.metrics = entry['metrics']
+        st.session_state.metrics_version = entry['version']
+        render_dashboard(entry, pr_states, issue_labels)
 
     # Query Section
     st.sidebar.header("Natural Language Queries")
@@ -360,14 +631,16 @@ def main():
         if 'metrics' in st.session_state and query:
             with st.spinner("Processing query..."):
                 try:
-                    # Handle the user's query and display results
-                    fig, description = handle_user_query(query, st.session_state.metrics)
+                    # Handle the user's query and display results; equivalent queries on the same
+                    # metrics are served from the query cache
+                    fig, description = cached_user_query(query, st.session_state.metrics,
+                                                         st.session_state.get('metrics_version'), get_query_cache())
                     st.write("### Query Results")
                     if fig:
                         st.write(description)
                         st.plotly_chart(fig, use_container_width=True)
                     else:
-                        st.warning("No results for the given query.")
+                        st.warning(description or "No results for the given query.")
                 except Exception as e:
                     st.error(f"Error processing query: {e}")
         else:
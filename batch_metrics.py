@@ -0,0 +1,146 @@
+"""Compute metrics for many repositories without the dashboard and write them to the export backend.
+
+Run with: python batch_metrics.py repos.txt [--format parquet] [--fetch-workers 4] [--processes 4]
+
+The repository list holds one owner/repo per line; blank lines and lines starting with # are skipped.
+Tokens are read from GITHUB_TOKENS / GITHUB_TOKEN and shared by all fetches through one scheduler.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from github_cache import GithubCache, DEFAULT_CACHE_PATH
+from github_data import collect_github_data
+from metrics_calculation import calculate_metrics
+from metrics_csv import COLUMNAR_EXPORT_PATH, COLUMNAR_FORMATS, export_all_metrics, export_metrics_columnar
+from metrics_history import DEFAULT_HISTORY_PATH, append_snapshot
+from rate_limit import RateLimitScheduler, tokens_from_config
+
+DEFAULT_FETCH_WORKERS = 4  # Repositories fetched at the same time; each fetch runs its own requests in parallel
+METRIC_FIELDS = ('commits', 'pull_requests', 'issues')  # All that is sent to the metric processes
+
+def read_repo_list(path):
+    with open(path, encoding='utf-8') as repo_file:
+        repos = [line.strip() for line in repo_file]
+    return [repo for repo in dict.fromkeys(repos) if repo and not repo.startswith('#')]
+
+def fetch_repo(repo, token, scheduler, cache, max_items, single_listing):
+    start = time.perf_counter()
+    data = collect_github_data(repo, token, cache=cache, max_items=max_items, scheduler=scheduler,
+                               pull_requests_from_issue_listing=single_listing)
+    if not data:
+        raise RuntimeError("nothing was fetched")
+    if data['fetch_errors']:
+        # Metrics over a listing that failed, completely or partway, would be exported as if complete
+        errors = "; ".join(f"{name}: {error}" for name, error in data['fetch_errors'].items())
+        raise RuntimeError(f"incomplete ({errors})")
+    return {field: data.get(field) or [] for field in METRIC_FIELDS}, time.perf_counter() - start
+
+def compute_metrics(data):
+    # Runs in a worker process; the record frames are only needed by dashboard queries, so they are
+    # not pickled back
+    start = time.perf_counter()
+    metrics = calculate_metrics(data)
+    metrics.pop('frames', None)
+    return metrics, time.perf_counter() - start
+
+def export_repo(metrics, repo, output, file_format):
+    if file_format == 'csv':
+        export_all_metrics(metrics, file_path=os.path.join(output, repo.replace('/', '__')))
+    else:
+        export_metrics_columnar(metrics, repo, root=output, file_format=file_format)
+
+def run_batch(repos, output=COLUMNAR_EXPORT_PATH, file_format='parquet', fetch_workers=DEFAULT_FETCH_WORKERS,
+              processes=None, use_cache=False, max_items=None, record_history=False, single_listing=True):
+    """Fetch every repository on a thread pool, compute metrics on a process pool and export them.
+
+    Returns a summary dict with the repositories that succeeded and failed and the time spent per phase.
+    """
+    tokens = tokens_from_config()
+    scheduler = RateLimitScheduler(tokens) if tokens else None
+    cache = GithubCache(DEFAULT_CACHE_PATH) if use_cache else None
+    token = tokens[0] if tokens else None
+
+    started = time.perf_counter()
+    succeeded, failed = [], {}
+    fetch_seconds = metric_seconds = 0.0
+    items = 0
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=processes) as metric_pool:
+        fetches = {fetch_pool.submit(fetch_repo, repo, token, scheduler, cache, max_items, single_listing): repo
+                   for repo in repos}
+        computations = {}
+        # Metrics for a repository start as soon as its fetch is done, while other fetches continue
+        for future in as_completed(fetches):
+            repo = fetches[future]
+            try:
+                data, seconds = future.result()
+            except Exception as e:
+                failed[repo] = f"fetch failed: {e}"
+                print(f"[{len(succeeded) + len(failed)}/{len(repos)}] {repo}: {failed[repo]}")
+                continue
+            fetch_seconds += seconds
+            items += sum(len(data[field]) for field in METRIC_FIELDS)
+            computations[metric_pool.submit(compute_metrics, data)] = repo
+
+        for future in as_completed(computations):
+            repo = computations[future]
+            try:
+                metrics, seconds = future.result()
+                metric_seconds += seconds
+                export_repo(metrics, repo, output, file_format)
+                if record_history:
+                    append_snapshot(metrics, repo, root=DEFAULT_HISTORY_PATH)
+                succeeded.append(repo)
+                print(f"[{len(succeeded) + len(failed)}/{len(repos)}] {repo}: done")
+            except Exception as e:
+                failed[repo] = f"metrics failed: {e}"
+                print(f"[{len(succeeded) + len(failed)}/{len(repos)}] {repo}: {failed[repo]}")
+    if cache is not None:
+        cache.close()
+
+    return {
+        'succeeded': succeeded,
+        'failed': failed,
+        'items': items,
+        'elapsed': time.perf_counter() - started,
+        'fetch_seconds': fetch_seconds,
+        'metric_seconds': metric_seconds,
+    }
+
+def print_summary(summary):
+    elapsed = summary['elapsed']
+    done = len(summary['succeeded'])
+    print(f"\n{done} of {done + len(summary['failed'])} repositories done in {elapsed:.1f}s "
+          f"({done / elapsed * 60 if elapsed else 0:.1f} repos/min, "
+          f"{summary['items'] / elapsed if elapsed else 0:.0f} items/s)")
+    print(f"Fetch time (summed over threads): {summary['fetch_seconds']:.1f}s, "
+          f"metric time (summed over processes): {summary['metric_seconds']:.1f}s")
+    for repo, error in summary['failed'].items():
+        print(f"  {repo}: {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('repo_list', help="File with one owner/repo per line")
+    parser.add_argument('--output', default=COLUMNAR_EXPORT_PATH, help="Root directory of the export")
+    parser.add_argument('--format', default='parquet', choices=['csv', *COLUMNAR_FORMATS])
+    parser.add_argument('--fetch-workers', type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument('--processes', type=int, default=None, help="Metric processes (default: one per CPU)")
+    parser.add_argument('--max-items', type=int, default=None, help="Cap on items per listing")
+    parser.add_argument('--use-cache', action='store_true', help="Use the local conditional-request cache")
+    parser.add_argument('--history', action='store_true', help="Also append every run to the metrics history")
+    parser.add_argument('--separate-pulls-listing', action='store_true',
+                        help="List pull requests from the pulls endpoint instead of the issues listing")
+    args = parser.parse_args()
+
+    repos = read_repo_list(args.repo_list)
+    summary = run_batch(repos, output=args.output, file_format=args.format, fetch_workers=args.fetch_workers,
+                        processes=args.processes, use_cache=args.use_cache, max_items=args.max_items,
+                        record_history=args.history, single_listing=not args.separate_pulls_listing)
+    print_summary(summary)
+    if summary['failed']:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark collect_github_data offline against a recorded cassette.
+
+Run with: python benchmark_fetch.py cassettes/owner__repo.json owner/repo [--latency 0.05] [--workers 1 8]
+
+Record the cassette first with github_replay.py record, using the same --per-page and --max-items.
+Every scenario (listing mode x cache state x worker count) is fetched --repeat times from a fresh
+stand-in with the same injected latency, rate limit and errors, so runs can be compared across
+machines and commits. With --tokens N the fetch goes through a pool of N made-up tokens, each with
+its own quota on the stand-in, to measure token rotation against --rate-limit.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from github_cache import GithubCache
+from github_data import collect_github_data, MAX_SUBRESOURCE_WORKERS, SECONDS_BETWEEN_REQUESTS
+from github_replay import Cassette, ReplayServer, RATE_LIMIT_WINDOW
+from rate_limit import RateLimitScheduler
+
+LISTING_MODES = {'issues': True, 'pulls': False}  # Mode name -> pull_requests_from_issue_listing
+CACHE_MODES = ('none', 'cold', 'warm')  # No cache, an empty cache, and a cache filled by an earlier fetch
+FETCHED_FIELDS = ('commits', 'pull_requests', 'issues', 'contributors')
+
+def run_scenario(cassette, repo, single_listing, cache_mode, workers, args, cache_directory):
+    """Return (best seconds, stand-in stats of the best run, items fetched) for one scenario."""
+    def fetch(base_url, cache, scheduler):
+        return collect_github_data(repo, None, base_url=base_url, cache=cache, per_page=args.per_page,
+                                   max_items=args.max_items, max_subresource_workers=workers,
+                                   pull_requests_from_issue_listing=single_listing,
+                                   seconds_between_requests=args.pause, scheduler=scheduler)
+
+    best = None
+    for run in range(args.repeat):
+        server = ReplayServer(cassette, latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                              error_rate=args.error_rate, seed=args.seed, rate_limit_window=args.rate_limit_window)
+        with server:
+            scheduler = None
+            if args.tokens:
+                scheduler = RateLimitScheduler([f"replay-token-{index}" for index in range(args.tokens)],
+                                               base_url=server.base_url)
+            cache = None
+            if cache_mode != 'none':
+                cache = GithubCache(os.path.join(cache_directory, f"{cache_mode}-{single_listing}-{workers}-{run}.sqlite3"))
+                if cache_mode == 'warm':
+                    fetch(server.base_url, cache, scheduler)
+                    server.reset_stats()
+            start = time.perf_counter()
+            data = fetch(server.base_url, cache, scheduler)
+            elapsed = time.perf_counter() - start
+            if cache is not None:
+                cache.close()
+        if not data:
+            raise RuntimeError("The fetch failed; check that the cassette was recorded with the same options")
+        items = sum(len(data.get(field) or []) for field in FETCHED_FIELDS)
+        if best is None or elapsed < best[0]:
+            best = (elapsed, dict(server.stats), items)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('cassette')
+    parser.add_argument('repo', help="owner/repo as recorded")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario; the best time is reported")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, MAX_SUBRESOURCE_WORKERS],
+                        help="Concurrent pull request requests to compare")
+    parser.add_argument('--modes', nargs='+', choices=list(LISTING_MODES), default=list(LISTING_MODES))
+    parser.add_argument('--cache-modes', nargs='+', choices=CACHE_MODES, default=list(CACHE_MODES))
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random seconds per response, at most")
+    parser.add_argument('--rate-limit', type=int, default=None, help="Requests allowed per window")
+    parser.add_argument('--rate-limit-window', type=float, default=RATE_LIMIT_WINDOW, help="Seconds per window")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with a 502")
+    parser.add_argument('--tokens', type=int, default=0,
+                        help="Fetch through a pool of this many tokens, each with its own --rate-limit quota")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--max-items', type=int, default=None)
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help=f"PyGithub's pause between requests (collect_github_data uses {SECONDS_BETWEEN_REQUESTS})")
+    args = parser.parse_args()
+
+    cassette = Cassette.load(args.cassette)
+    print(f"{len(cassette)} recorded responses, latency {args.latency}s, jitter {args.jitter}s, "
+          f"rate limit {args.rate_limit or '-'}, error rate {args.error_rate}, tokens {args.tokens or '-'}")
+    print(f"{'listing':<8} {'cache':<6} {'workers':>7} {'best (s)':>9} {'served':>7} {'304':>5} {'limited':>8} "
+          f"{'errors':>7} {'missing':>8} {'items':>7}")
+    with tempfile.TemporaryDirectory() as cache_directory:
+        for mode in args.modes:
+            for cache_mode in args.cache_modes:
+                for workers in args.workers:
+                    seconds, stats, items = run_scenario(cassette, args.repo, LISTING_MODES[mode], cache_mode,
+                                                         workers, args, cache_directory)
+                    print(f"{mode:<8} {cache_mode:<6} {workers:>7} {seconds:>9.3f} {stats.get('served', 0):>7} "
+                          f"{stats.get('not_modified', 0):>5} {stats.get('rate_limited', 0):>8} "
+                          f"{stats.get('errors', 0):>7} {stats.get('missing', 0):>8} {items:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark how long each module takes to import and check that non-UI modules stay free of the UI stack.
+
+Run with: python benchmark_imports.py [--repeat 5] [modules ...]
+
+Every import is timed in a fresh interpreter. The exit status is 1 if a module outside the dashboard
+loads plotly, kaleido or streamlit at import time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+UI_PACKAGES = ('plotly', 'kaleido', 'streamlit')
+# Modules used by batch jobs and tests; importing them must not pull in UI_PACKAGES
+NON_UI_MODULES = ['records', 'rate_limit', 'github_cache', 'github_data', 'metrics_calculation', 'metrics_csv',
+                  'metrics_history', 'query_module', 'comparison', 'batch_metrics', 'github_replay']
+UI_MODULES = ['charts', 'app']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = sorted({{name.split('.')[0] for name in sys.modules}} & set({packages!r}))
+print(json.dumps({{'seconds': elapsed, 'loaded': loaded}}))
+"""
+
+def time_import(module, repeat):
+    """Return (best seconds, UI packages loaded) for importing a module in a fresh interpreter."""
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, packages=UI_PACKAGES)],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return min(result['seconds'] for result in results), results[0]['loaded']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=NON_UI_MODULES + UI_MODULES)
+    parser.add_argument('--repeat', type=int, default=5, help="Imports per module; the best time is reported")
+    args = parser.parse_args()
+
+    print(f"{'module':<22} {'best (s)':>9}  UI packages loaded")
+    violations = []
+    for module in args.modules:
+        try:
+            seconds, loaded = time_import(module, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<22} {'failed':>9}  {e.stderr.strip().splitlines()[-1] if e.stderr else ''}")
+            violations.append(module)
+            continue
+        print(f"{module:<22} {seconds:>9.3f}  {', '.join(loaded) or '-'}")
+        if module in NON_UI_MODULES and loaded:
+            violations.append(module)
+    if violations:
+        print(f"\nModules failing the import check: {', '.join(violations)}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
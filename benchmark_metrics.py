@@ -0,0 +1,59 @@
+"""Benchmark how calculate_metrics scales with the number of commits, issues and pull requests.
+
+Run with: python benchmark_metrics.py [--sizes 1000 10000 100000 1000000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from metrics_calculation import calculate_metrics
+from records import CommitRecord, IssueRecord, PullRequestRecord
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+def generate_data(size, seed=0):
+    """Build a synthetic dataset with `size` commits and issues and a tenth as many pull requests."""
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    span_hours = 24 * 365 * 8
+    authors = [f"author-{i}" for i in range(max(10, size // 1000))]
+
+    commits = [
+        CommitRecord(f"{i:040x}", rng.choice(authors), start + timedelta(hours=rng.randrange(span_hours)))
+        for i in range(size)
+    ]
+    issues = []
+    for i in range(size):
+        created_at = start + timedelta(hours=rng.randrange(span_hours))
+        closed_at = created_at + timedelta(hours=rng.randrange(24 * 90)) if rng.random() < 0.7 else None
+        issues.append(IssueRecord(i, f"Issue {i}", 'closed' if closed_at else 'open', rng.choice(authors),
+                                  created_at, closed_at or created_at, closed_at, rng.randrange(50), (), False))
+    pull_requests = []
+    for i in range(max(1, size // 10)):
+        created_at = start + timedelta(hours=rng.randrange(span_hours))
+        merged_at = created_at + timedelta(hours=rng.randrange(24 * 30)) if rng.random() < 0.6 else None
+        pull_requests.append(PullRequestRecord(i, f"PR {i}", 'closed' if merged_at else 'open', rng.choice(authors),
+                                               created_at, merged_at or created_at, merged_at, merged_at, ()))
+    return {'commits': commits, 'issues': issues, 'pull_requests': pull_requests}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per size; the best time is reported")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'best (s)':>10} {'per item (us)':>14}")
+    for size in args.sizes:
+        data = generate_data(size)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            calculate_metrics(data)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        items = size * 2 + len(data['pull_requests'])
+        print(f"{size:>10} {best:>10.3f} {best / items * 1e6:>14.2f}")
+
+if __name__ == "__main__":
+    main()
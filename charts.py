@@ -1,6 +1,19 @@
+import hashlib
+import json
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+
+# plotly.express costs more to import than the rest of plotly, so the chart functions using it import it
+# on first use; kaleido is only loaded by plotly when images are exported
 
 # Define a color palette with shades of blue
 blue_palette = {
@@ -13,8 +26,17 @@ blue_palette = {
     "highlight": "#00BFFF",  # Bright highlight color
 }
 
-def update_plotly_colors(fig: go.Figure) -> go.Figure:
-    fig.update_layout(
+MAX_MARKER_POINTS = 200  # Line charts with more points are drawn without markers
+DASHBOARD_TEMPLATE = 'dashboard_blue'
+FIGURE_CACHE_SIZE = 128  # Serialized figures kept for reuse across reruns and sessions
+GAUGE_MAX = 30  # Days at the end of every gauge's axis
+EXPORT_DIRECTORY = 'chart_exports'  # Every batch export gets a timestamped folder in here
+
+def register_dashboard_template():
+    # The default plotly template with the dashboard's colors, registered once and made the default so
+    # figures pick it up without re-validating a template per figure
+    template = go.layout.Template(pio.templates['plotly'])
+    template.layout.update(
         paper_bgcolor=blue_palette["background"],
         plot_bgcolor=blue_palette["background"],
         font_color=blue_palette["text"],
@@ -26,18 +48,102 @@ def update_plotly_colors(fig: go.Figure) -> go.Figure:
             blue_palette["highlight"]
         ]
     )
+    pio.templates[DASHBOARD_TEMPLATE] = template
+    pio.templates.default = DASHBOARD_TEMPLATE
+
+register_dashboard_template()
+
+_figure_cache = OrderedDict()  # (metric id, data fingerprint) -> figure JSON without the template
+_figure_cache_lock = threading.Lock()
+
+def data_fingerprint(data) -> str:
+    digest = hashlib.sha1()
+    if isinstance(data, (pd.Series, pd.DataFrame)):
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+        digest.update(repr((getattr(data, 'name', None), list(getattr(data, 'columns', [])))).encode())
+    else:
+        digest.update(json.dumps(data, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def cached_chart(metric_id, plot_function, data, **kwargs) -> go.Figure:
+    # Figures are kept as JSON keyed by the metric and a fingerprint of its data, so an unchanged
+    # metric is loaded from its spec instead of being rebuilt through plotly express
+    key = (metric_id, data_fingerprint(data), data_fingerprint(kwargs))
+    with _figure_cache_lock:
+        spec = _figure_cache.get(key)
+        if spec is not None:
+            _figure_cache.move_to_end(key)
+    if spec is None:
+        spec = plot_function(data, **kwargs).to_plotly_json()
+        spec['layout'].pop('template', None)  # Re-applied as the default template on load
+        spec = pio.to_json(spec, validate=False)
+        with _figure_cache_lock:
+            _figure_cache[key] = spec
+            while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.popitem(last=False)
+    return pio.from_json(spec)
+
+# Largest-triangle-three-buckets: keeps the first and last points, and from every bucket in between
+# the point forming the largest triangle with the previously kept point and the next bucket's average
+def lttb_indices(x, y, threshold):
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+    return selected
+
+def downsample_series(frame: pd.DataFrame, column: str, max_points: int) -> pd.DataFrame:
+    if max_points is None or len(frame) <= max_points:
+        return frame
+    index = frame.index
+    x = index.asi8 if isinstance(index, pd.DatetimeIndex) else index
+    return frame.iloc[lttb_indices(x, frame[column], max_points)]
+
+def update_plotly_colors(fig: go.Figure) -> go.Figure:
+    # Figures built after import already use the dashboard template; this re-applies it to others
+    fig.update_layout(template=DASHBOARD_TEMPLATE)
     return fig
 
+def plot_gauge(value: float, title: str) -> go.Figure:
+    return go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=float(value),
+        title={"text": title},
+        gauge={'axis': {'range': [None, GAUGE_MAX]},
+               'bar': {'color': blue_palette["highlight"]},
+               'steps': [{'range': [0, 10], 'color': blue_palette["tertiary"]},
+                         {'range': [10, 20], 'color': blue_palette["quaternary"]},
+                         {'range': [20, GAUGE_MAX], 'color': blue_palette["secondary"]}]}
+    ))
+
 def plot_language_distribution(df: pd.DataFrame) -> go.Figure:
+    import plotly.express as px
+
     if 'Language' not in df.columns or 'Bytes' not in df.columns:
         raise ValueError("DataFrame must contain 'Language' and 'Bytes' columns")
     fig = px.pie(df, names='Language', values='Bytes', title='Language Distribution',
                  color_discrete_sequence=[blue_palette["primary"]])
-    fig = update_plotly_colors(fig)
     fig.update_layout(margin=dict(t=0, b=0, l=0, r=0))
     return fig
 
-def plot_commit_frequency(commit_frequency_data) -> go.Figure:
+def plot_commit_frequency(commit_frequency_data, max_points=None) -> go.Figure:
+    import plotly.express as px
+
     if isinstance(commit_frequency_data, pd.Series):
         commit_frequency_df = commit_frequency_data.to_frame(name='commit_frequency')
     elif isinstance(commit_frequency_data, list):
@@ -46,10 +152,12 @@ def plot_commit_frequency(commit_frequency_data) -> go.Figure:
         commit_frequency_df = commit_frequency_data
     else:
         raise TypeError("Invalid data type for commit_frequency_data")
-    
+    # Long histories are reduced to about max_points points before they are sent to the browser
+    commit_frequency_df = downsample_series(commit_frequency_df, 'commit_frequency', max_points)
+
     fig = px.line(commit_frequency_df, x=commit_frequency_df.index, y='commit_frequency', title='Commit Frequency Over Time',
-                  markers=True, line_shape='linear', color_discrete_sequence=[blue_palette["primary"]])
-    fig = update_plotly_colors(fig)
+                  markers=len(commit_frequency_df) <= MAX_MARKER_POINTS, line_shape='linear',
+                  color_discrete_sequence=[blue_palette["primary"]])
     fig.update_layout(xaxis_title='Date', yaxis_title='Commit Count')
     return fig
 
@@ -59,26 +167,16 @@ def plot_pull_request_merge_rate(merge_rate: dict) -> go.Figure:
     fig = go.Figure()
     fig.add_trace(go.Bar(x=['Total PRs', 'Merged PRs'], y=[merge_rate['total_prs'], merge_rate['merged_prs']],
                          marker_color=[blue_palette["secondary"], blue_palette["tertiary"]]))
-    fig = update_plotly_colors(fig)
     fig.update_layout(title='Pull Request Merge Rate', xaxis_title='PRs', yaxis_title='Count',
                       xaxis=dict(tickvals=['Total PRs', 'Merged PRs'], ticktext=['Total PRs', 'Merged PRs']))
     return fig
 
 def plot_average_issue_resolution_time(avg_resolution_time: float) -> go.Figure:
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=float(avg_resolution_time),
-        title={"text": "Avg. Issue Resolution Time (Days)"},
-        gauge={'axis': {'range': [None, 30]},
-               'bar': {'color': blue_palette["highlight"]},
-               'steps': [{'range': [0, 10], 'color': blue_palette["tertiary"]},
-                         {'range': [10, 20], 'color': blue_palette["quaternary"]},
-                         {'range': [20, 30], 'color': blue_palette["secondary"]}]}
-    ))
-    fig = update_plotly_colors(fig)
-    return fig
+    return plot_gauge(avg_resolution_time, "Avg. Issue Resolution Time (Days)")
 
 def plot_contributor_activity(contributor_activity_series) -> go.Figure:
+    import plotly.express as px
+
     if isinstance(contributor_activity_series, pd.Series):
         contributor_activity_df = contributor_activity_series.reset_index()
         contributor_activity_df.columns = ['contributor', 'contributor_activity']
@@ -89,47 +187,57 @@ def plot_contributor_activity(contributor_activity_series) -> go.Figure:
     
     fig = px.bar(contributor_activity_df, x='contributor', y='contributor_activity', title='Contributor Activity',
                  color='contributor_activity', color_continuous_scale=[blue_palette["primary"], blue_palette["tertiary"]])
-    fig = update_plotly_colors(fig)
     fig.update_layout(xaxis_title='Contributor', yaxis_title='Activity Count', xaxis_tickangle=-45)
     return fig
 
 def plot_top_issues_by_comments(top_issues_df: pd.DataFrame) -> go.Figure:
+    import plotly.express as px
+
     if 'title' not in top_issues_df.columns or 'comments' not in top_issues_df.columns:
         raise ValueError("DataFrame must contain 'title' and 'comments' columns")
     fig = px.bar(top_issues_df, x='title', y='comments', title='Top Issues by Comments',
                  labels={'title': 'Issue Title', 'comments': 'Number of Comments'},
                  color='comments', color_continuous_scale=[blue_palette["primary"], blue_palette["tertiary"]])
-    fig = update_plotly_colors(fig)
     fig.update_layout(xaxis_title='Issue Title', yaxis_title='Number of Comments', xaxis_tickangle=-45)
     return fig
 
 def plot_average_pull_request_review_time(avg_review_time: float) -> go.Figure:
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=float(avg_review_time),
-        title={"text": "Avg. PR Review Time (Days)"},
-        gauge={'axis': {'range': [None, 30]},
-               'bar': {'color': blue_palette["highlight"]},
-               'steps': [{'range': [0, 10], 'color': blue_palette["tertiary"]},
-                         {'range': [10, 20], 'color': blue_palette["quaternary"]},
-                         {'range': [20, 30], 'color': blue_palette["secondary"]}]}
-    ))
-    fig = update_plotly_colors(fig)
-    return fig
+    return plot_gauge(avg_review_time, "Avg. PR Review Time (Days)")
 
 def plot_average_issue_age(avg_issue_age: float) -> go.Figure:
-    # Ensure the value is a standard Python float
-    avg_issue_age = float(avg_issue_age)
+    return plot_gauge(avg_issue_age, "Avg. Issue Age (Days)")
 
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=avg_issue_age,
-        title={"text": "Avg. Issue Age (Days)"},
-        gauge={'axis': {'range': [None, 30]},
-               'bar': {'color': blue_palette["highlight"]},
-               'steps': [{'range': [0, 10], 'color': blue_palette["tertiary"]},
-                         {'range': [10, 20], 'color': blue_palette["quaternary"]},
-                         {'range': [20, 30], 'color': blue_palette["secondary"]}]}
-    ))
-    fig = update_plotly_colors(fig)
+def plot_metric_trend(trend: pd.Series, title: str) -> go.Figure:
+    import plotly.express as px
+
+    fig = px.line(x=trend.index, y=trend.values, title=title, markers=len(trend) <= MAX_MARKER_POINTS,
+                  color_discrete_sequence=[blue_palette["primary"]])
+    fig.update_layout(xaxis_title='Date', yaxis_title=title)
     return fig
+
+def export_figures(figures: dict, directory=None, formats=('png',)) -> list:
+    """Write every figure in every format into one directory and return the written paths.
+
+    With kaleido 1.x all images are rendered by a single write_images call, so the renderer starts
+    once for the whole batch; older versions keep one renderer per process and take the loop.
+    """
+    if directory is None:
+        directory = os.path.join(EXPORT_DIRECTORY, datetime.now().strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(directory, exist_ok=True)
+    batch = [(fig, os.path.join(directory, f"{name}.{image_format}"))
+             for name, fig in figures.items() for image_format in formats]
+    if not batch:
+        return []
+    if hasattr(pio, 'write_images'):
+        pio.write_images([fig for fig, _ in batch], [path for _, path in batch], validate=False)
+    else:
+        for fig, path in batch:
+            pio.write_image(fig, path, validate=False)
+    return [path for _, path in batch]
+
+def zip_files(paths) -> bytes:
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for path in paths:
+            bundle.write(path, os.path.basename(path))
+    return archive.getvalue()
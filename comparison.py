@@ -1,62 +1,55 @@
 import pandas as pd
-import plotly.graph_objects as go
-import streamlit as st
+
+# Rows of the comparison table: metric name, profile field and the value used when the field is missing
+COMPARISON_FIELDS = [
+    ('Public Repos', 'public_repos', 0),
+    ('Followers', 'followers', 0),
+    ('Following', 'following', 0),
+    ('Created At', 'created_at', 'N/A'),
+]
+COMPARISON_COLORS = ['#1f77b4', '#aec7e8', '#4682B4', '#87CEEB', '#B0C4DE', '#00BFFF']  # Shades of blue, cycled
 
 def fetch_profile_data(github_data, owner_login):
     """Fetch and return profile data for a given GitHub owner login."""
     profile = github_data.get(owner_login, {}).get('profile', {})
     return profile
 
+def generate_profiles_comparison_dataframe(profiles):
+    """Generate a DataFrame with one column per profile, from a dict of column label to profile."""
+    columns = {
+        label: [profile.get(field, default) for _, field, default in COMPARISON_FIELDS] if profile
+        else ['N/A'] * len(COMPARISON_FIELDS)
+        for label, profile in profiles.items()
+    }
+    return pd.DataFrame({'Metric': [metric for metric, _, _ in COMPARISON_FIELDS], **columns})
+
 def generate_comparison_dataframe(primary_profile, secondary_profile):
     """Generate a DataFrame comparing the primary and secondary profiles."""
-    comparison_df = pd.DataFrame({
-        'Metric': ['Public Repos', 'Followers', 'Following', 'Created At'],
-        'Primary Owner': [
-            primary_profile.get('public_repos', 0),
-            primary_profile.get('followers', 0),
-            primary_profile.get('following', 0),
-            primary_profile.get('created_at', 'N/A')
-        ],
-        'Secondary Owner': [
-            secondary_profile.get('public_repos', 0) if secondary_profile else 'N/A',
-            secondary_profile.get('followers', 0) if secondary_profile else 'N/A',
-            secondary_profile.get('following', 0) if secondary_profile else 'N/A',
-            secondary_profile.get('created_at', 'N/A') if secondary_profile else 'N/A'
-        ]
-    })
-    return comparison_df
+    return generate_profiles_comparison_dataframe({'Primary Owner': primary_profile,
+                                                   'Secondary Owner': secondary_profile})
 
 def plot_comparison_bar_chart(comparison_df):
-    """Plot a bar chart comparing metrics of two profiles with a blue color palette and better layout."""    
-    fig = go.Figure()
+    """Plot a bar chart comparing metrics of every profile column with a blue color palette and better layout."""
+    import plotly.graph_objects as go
 
-    blue_palette = ['#1f77b4', '#aec7e8']  # Dark blue and light blue
+    fig = go.Figure()
 
-    # Adjust bar width to prevent overlapping
-    bar_width = 0.4
+    profile_columns = [column for column in comparison_df.columns if column != 'Metric']
+    # Groups keep the same overall width however many profiles share them
+    bar_width = 0.8 / max(2, len(profile_columns))
 
     # Create bar traces
-    fig.add_trace(go.Bar(
-        x=comparison_df['Metric'],
-        y=comparison_df['Primary Owner'],
-        name='Primary Owner',
-        text=comparison_df['Primary Owner'],
-        textposition='auto',
-        marker_color=blue_palette[0],
-        width=bar_width,
-        opacity=0.8
-    ))
-
-    fig.add_trace(go.Bar(
-        x=comparison_df['Metric'],
-        y=comparison_df['Secondary Owner'],
-        name='Secondary Owner',
-        text=comparison_df['Secondary Owner'],
-        textposition='auto',
-        marker_color=blue_palette[1],
-        width=bar_width,
-        opacity=0.8
-    ))
+    for i, column in enumerate(profile_columns):
+        fig.add_trace(go.Bar(
+            x=comparison_df['Metric'],
+            y=comparison_df[column],
+            name=column,
+            text=comparison_df[column],
+            textposition='auto',
+            marker_color=COMPARISON_COLORS[i % len(COMPARISON_COLORS)],
+            width=bar_width,
+            opacity=0.8
+        ))
 
     # Update layout
     fig.update_layout(
@@ -76,26 +69,33 @@ def plot_comparison_bar_chart(comparison_df):
 
     return fig
 
-def display_comparison_with_description(primary_profile, secondary_profile):
+def describe_profiles_comparison(profiles):
+    """Describe which of the profiles, given as a dict of label to profile, looks the most engaged."""
+    followers = {label: (profile or {}).get('followers', 0) for label, profile in profiles.items()}
+    repos = {label: (profile or {}).get('public_repos', 0) for label, profile in profiles.items()}
+    leader = max(followers, key=followers.get) if followers else None
+    # The leader has to be ahead on both counts, not just tied with someone
+    if leader is not None and all(followers[leader] > followers[label] and repos[leader] > repos[label]
+                                  for label in profiles if label != leader):
+        others = ' and the '.join(label for label in profiles if label != leader)
+        return (f"The {leader} has more followers and repositories than the {others}. "
+                f"This suggests that the {leader} is likely a more engaging user on GitHub compared to the {others}.")
+    return "The engagement levels of the compared profiles are comparable based on the available metrics."
+
+def display_comparison_with_description(primary_profile, *other_profiles):
     """Generate and display the comparison chart with a description."""
-    comparison_df = generate_comparison_dataframe(primary_profile, secondary_profile)
+    import streamlit as st
+
+    if len(other_profiles) == 1:
+        profiles = {'Primary Owner': primary_profile, 'Secondary Owner': other_profiles[0]}
+    else:
+        profiles = {'Primary Owner': primary_profile,
+                    **{f"Owner {i}": profile for i, profile in enumerate(other_profiles, start=2)}}
+    comparison_df = generate_profiles_comparison_dataframe(profiles)
     fig = plot_comparison_bar_chart(comparison_df)
-    
+
     # Display the chart
     st.plotly_chart(fig)
-    
-    # Determine which profile has higher followers and repos
-    primary_followers = primary_profile.get('followers', 0)
-    primary_repos = primary_profile.get('public_repos', 0)
-    secondary_followers = secondary_profile.get('followers', 0) if secondary_profile else 0
-    secondary_repos = secondary_profile.get('public_repos', 0) if secondary_profile else 0
-    
-    if primary_followers > secondary_followers and primary_repos > secondary_repos:
-        description = "The Primary Owner has more followers and repositories than the Secondary Owner. This suggests that the Primary Owner is likely a more engaging user on GitHub compared to the Secondary Owner."
-    elif secondary_followers > primary_followers and secondary_repos > primary_repos:
-        description = "The Secondary Owner has more followers and repositories than the Primary Owner. This suggests that the Secondary Owner is likely a more engaging user on GitHub compared to the Primary Owner."
-    else:
-        description = "The engagement levels of the Primary and Secondary Owners are comparable based on the available metrics."
 
     # Display the description
-    st.write(description)
+    st.write(describe_profiles_comparison(profiles))
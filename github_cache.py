@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = 'github_cache.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    repo TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (repo, endpoint)
+);
+CREATE TABLE IF NOT EXISTS entities (
+    repo TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (repo, endpoint, key)
+);
+CREATE INDEX IF NOT EXISTS entities_by_position ON entities (repo, endpoint, position);
+CREATE TABLE IF NOT EXISTS watermarks (
+    repo TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (repo, endpoint)
+);
+"""
+
+class GithubCache:
+    """Local SQLite store of GitHub entities together with the validators used for conditional requests.
+
+    Every endpoint (for example 'commits', 'issues' or 'pulls/42/reviews') is stored per repository
+    as one row per entity, so listings can be reloaded without talking to GitHub when it answers
+    304 Not Modified.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def get_validators(self, repo, endpoint):
+        """Return the (etag, last_modified) pair stored for an endpoint, or None if it was never cached."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified FROM responses WHERE repo = ? AND endpoint = ?",
+                (repo, endpoint)
+            ).fetchone()
+        return row
+
+    def load(self, repo, endpoint):
+        """Return the cached entities of an endpoint in their original order."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT data FROM entities WHERE repo = ? AND endpoint = ? ORDER BY position",
+                (repo, endpoint)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get_watermark(self, repo, endpoint):
+        """Return the newest timestamp seen for an endpoint (an ISO 8601 string), or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM watermarks WHERE repo = ? AND endpoint = ?",
+                (repo, endpoint)
+            ).fetchone()
+        return row[0] if row else None
+
+    def store(self, repo, endpoint, items, etag=None, last_modified=None, key=None, watermark=None):
+        """Replace the cached entities of an endpoint and remember its validators.
+
+        key maps an entity to a stable identifier (e.g. a commit SHA); positions are used otherwise.
+        """
+        rows = [
+            (repo, endpoint, str(key(item)) if key else str(position), position, json.dumps(item, default=str))
+            for position, item in enumerate(items)
+        ]
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entities WHERE repo = ? AND endpoint = ?", (repo, endpoint))
+            self._connection.executemany("INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)", rows)
+            self._save_response(repo, endpoint, etag, last_modified, watermark)
+
+    def merge(self, repo, endpoint, items, key, etag=None, last_modified=None, watermark=None):
+        """Upsert entities into an endpoint's cached listing.
+
+        Entities whose key is already cached are replaced in place; new ones are put in front of the
+        listing in the order given, since deltas arrive newest first. Returns the set of keys that
+        were already cached.
+        """
+        keyed = [(str(key(item)), item) for item in items]
+        with self._lock, self._connection:
+            existing = dict(self._connection.execute(
+                "SELECT key, position FROM entities WHERE repo = ? AND endpoint = ?",
+                (repo, endpoint)
+            ).fetchall())
+            first_position = min(existing.values(), default=0)
+            new_keys = [item_key for item_key, _ in keyed if item_key not in existing]
+            positions = {item_key: first_position - len(new_keys) + offset for offset, item_key in enumerate(new_keys)}
+            positions.update(existing)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)",
+                [(repo, endpoint, item_key, positions[item_key], json.dumps(item, default=str))
+                 for item_key, item in keyed]
+            )
+            self._save_response(repo, endpoint, etag, last_modified, watermark)
+        return {item_key for item_key, _ in keyed if item_key in existing}
+
+    def _save_response(self, repo, endpoint, etag, last_modified, watermark):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (repo, endpoint, etag, last_modified, time.time())
+        )
+        if watermark is not None:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)",
+                (repo, endpoint, watermark)
+            )
+
+    def clear(self, repo=None):
+        """Drop everything cached for one repository, or the whole cache."""
+        with self._lock, self._connection:
+            for table in ('responses', 'entities', 'watermarks'):
+                if repo is None:
+                    self._connection.execute(f"DELETE FROM {table}")
+                else:
+                    self._connection.execute(f"DELETE FROM {table} WHERE repo = ?", (repo,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,35 +1,470 @@
-from github import Github, RateLimitExceededException
+from github import Consts, Github, GithubRetry, RateLimitExceededException
+from github.NamedUser import NamedUser
+from github.PullRequest import PullRequest
+from github.Repository import Repository
+from rate_limit import PooledTokenAuth, last_pooled_request
+from records import (
+    CommitRecord,
+    ContributorRecord,
+    IssueRecord,
+    PullRequestRecord,
+    ReviewCommentRecord,
+    ReviewRecord,
+    parse_github_timestamp
+)
+import json
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from itertools import takewhile
 
-MAX_PAGES = 1  # Limit to 1 page for demonstration
+MAX_PAGES = None  # No page limit by default; set a number to cap every listing
 MAX_CONTRIBUTORS_PAGES = 1  # Limit contributors pages to avoid high load
+DEFAULT_PER_PAGE = 100  # Largest page size the GitHub API allows
+MAX_FETCH_WORKERS = 5  # Upper bound on listings fetched at the same time
+MAX_SUBRESOURCE_WORKERS = 8  # Upper bound on per-PR requests in flight
+RATE_LIMIT_RETRIES = 3  # Attempts to wait out a rate limit before giving up
+DEFAULT_RATE_LIMIT_WAIT = 60  # Seconds to wait when GitHub gives no reset time
+POOLED_RATE_LIMIT_WAIT = 0  # Seconds PyGithub may wait out a rate limit itself when a token pool could rotate instead
+SECONDS_BETWEEN_REQUESTS = 0.25  # PyGithub's pause between requests when no scheduler paces them
+PROFILE_TTL = 15 * 60  # Seconds a fetched profile is reused before it is fetched again
+PROFILE_CACHE_SIZE = 256  # Profiles kept in a ProfileCache
 
-def fetch_paginated_data(fetch_function, *args, **kwargs):
+# Sub-resources that can be fetched for every pull request, mapped to the
+# PyGithub method that lists them, their API path below the pull request
+# and the record they are normalized into
+PR_SUBRESOURCES = {
+    'reviews': ('get_reviews', 'reviews', ReviewRecord),
+    'review_comments': ('get_review_comments', 'comments', ReviewCommentRecord),
+    'commits': ('get_commits', 'commits', CommitRecord),
+}
+
+# Shared across worker threads so that one worker hitting the rate limit
+# pauses every other worker instead of letting them burn through retries
+_rate_limit_lock = threading.Lock()
+_rate_limit_resume_at = 0.0
+
+def iter_pages(paginated_list, per_page=None, max_pages=MAX_PAGES):
+    """Yield the pages of a PaginatedList one request at a time.
+
+    Unlike iterating the PaginatedList itself, pages already handed out are not kept alive.
+    Passing the client's per_page lets a short page end the listing without one more request.
+    """
+    page = 0
+    while max_pages is None or page < max_pages:
+        print(f"Fetching page {page + 1}")
+        items = call_with_rate_limit_retry(paginated_list.get_page, page)
+        if not items:
+            return
+        yield items
+        if per_page is not None and len(items) < per_page:
+            return
+        page += 1
+
+def iter_paginated(paginated_list, per_page=None, max_pages=MAX_PAGES, max_items=None, since=None, date_of=None):
+    """Stream the items of a newest-first PaginatedList as its pages arrive.
+
+    Stops after max_items items, or at the first item for which date_of(item) is older than since.
+    """
+    count = 0
+    for page in iter_pages(paginated_list, per_page, max_pages):
+        for item in page:
+            if max_items is not None and count >= max_items:
+                return
+            if since is not None and date_of(item) < since:
+                return
+            yield item
+            count += 1
+
+class IncompleteListingError(Exception):
+    """A listing failed partway through; items holds what arrived before the error."""
+    def __init__(self, items, cause):
+        super().__init__(f"listing stopped after {len(items)} items: {cause}")
+        self.items = items
+
+def fetch_paginated_data(fetch_function, *args, per_page=None, max_pages=MAX_PAGES, max_items=None,
+                         since=None, date_of=None, convert=None, **kwargs):
+    """Collect the items of the PaginatedList returned by fetch_function.
+
+    With convert, every item is converted (for example into its raw JSON or a record) as its page
+    arrives, so only one page of PyGithub objects is alive at a time. An error partway through
+    raises IncompleteListingError with the items that arrived before it, so a truncated listing
+    is never mistaken for (or cached as) the whole one.
+    """
     all_items = []
-    page = 1
-    while page <= MAX_PAGES:
-        print(f"Fetching page {page}")
+    try:
+        for item in iter_paginated(fetch_function(*args, **kwargs), per_page, max_pages, max_items, since, date_of):
+            all_items.append(item if convert is None else convert(item))
+    except Exception as e:
+        raise IncompleteListingError(all_items, e) from e
+    return all_items
+
+def _seconds_until_reset(exception):
+    headers = getattr(exception, 'headers', None) or {}
+    if 'retry-after' in headers:
+        return float(headers['retry-after'])
+    if 'x-ratelimit-reset' in headers:
+        return max(0.0, float(headers['x-ratelimit-reset']) - time.time())
+    return DEFAULT_RATE_LIMIT_WAIT
+
+def call_with_rate_limit_retry(fetch_function, *args, retries=RATE_LIMIT_RETRIES, **kwargs):
+    """Call fetch_function, waiting out rate limits shared across threads before retrying.
+
+    When the request went through a token pool, only the offending token is rested and the
+    pool's scheduler moves the retry to another token or sleeps until the earliest reset.
+    """
+    global _rate_limit_resume_at
+    for attempt in range(retries + 1):
+        with _rate_limit_lock:
+            wait = _rate_limit_resume_at - time.time()
+        if wait > 0:
+            time.sleep(wait)
         try:
-            items = fetch_function(*args, **kwargs)
-            if not items:
-                break
-            all_items.extend(items)
-            page += 1
+            return fetch_function(*args, **kwargs)
         except RateLimitExceededException as e:
-            print(f"Rate limit exceeded: {e}. Sleeping for 60 seconds.")
-            time.sleep(60)  # Sleep to avoid hitting the rate limit
+            if attempt == retries:
+                raise
+            wait = _seconds_until_reset(e)
+            pooled = last_pooled_request()
+            if pooled is not None:
+                scheduler, token = pooled
+                print(f"Rate limit exceeded on token ...{token[-4:]}: {e}. Resting it for {wait:.0f} seconds.")
+                scheduler.mark_exhausted(token, time.time() + wait)
+                continue
+            print(f"Rate limit exceeded: {e}. Sleeping for {wait:.0f} seconds.")
+            with _rate_limit_lock:
+                _rate_limit_resume_at = max(_rate_limit_resume_at, time.time() + wait)
+
+def raw_data_of(github_object):
+    # The public raw_data property issues a completion request for every
+    # partially loaded listing item, so read the already fetched payload
+    return github_object._rawData
+
+def pull_request_raw_from_issue(raw):
+    """Rebuild the pull request fields the dashboard uses from the pull request's issues listing entry."""
+    marker = raw['pull_request']
+    pr_raw = {field: raw.get(field) for field in ('number', 'title', 'state', 'user', 'created_at', 'updated_at',
+                                                  'closed_at')}
+    pr_raw['url'] = marker.get('url')
+    # Older GitHub Enterprise servers leave merged_at off the marker; complete_merged_at fills it in
+    if 'merged_at' in marker:
+        pr_raw['merged_at'] = marker['merged_at']
+    return pr_raw
+
+def complete_merged_at(g, pr_raws, max_workers=MAX_SUBRESOURCE_WORKERS, cache=None, repo_key=None):
+    """Fill in merged_at on the pull requests rebuilt from the issues listing whose marker lacks it.
+
+    Everything but merged_at is on the issue entry, and current GitHub versions put merged_at on the
+    marker too. Only closed pull requests missing it are requested on their own, conditionally when
+    a cache is given.
+    """
+    incomplete = [pr_raw for pr_raw in pr_raws if 'merged_at' not in pr_raw and pr_raw['state'] == 'closed']
+
+    def complete(pr_raw):
+        if cache is None:
+            _, full_raw = call_with_rate_limit_retry(g.requester.requestJsonAndCheck, 'GET', pr_raw['url'])
+        else:
+            full_raw = call_with_rate_limit_retry(fetch_cached_resource, g, cache, repo_key,
+                                                  f"pulls/{pr_raw['number']}", pr_raw['url'])
+        pr_raw['merged_at'] = full_raw.get('merged_at')
+
+    if incomplete:
+        print(f"Fetching {len(incomplete)} pull requests missing merged_at")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(incomplete)))) as executor:
+            list(executor.map(complete, incomplete))
+
+def issue_or_pull_request(raw):
+    """Normalize an issues listing entry into an IssueRecord, or a pull request's fields for the
+    entries that are pull requests (they carry a pull_request marker)."""
+    if 'pull_request' in raw:
+        return pull_request_raw_from_issue(raw)
+    return IssueRecord.from_raw(raw)
+
+def listing_cache_key(endpoint, **limits):
+    """Name under which a listing fetched with the given limits is cached.
+
+    A capped listing is a different dataset from the full one, so each combination of limits gets
+    its own entry, validators and watermark. Limits left as None are not part of the name.
+    """
+    applied = [f"{name}={value.isoformat() if hasattr(value, 'isoformat') else value}"
+               for name, value in sorted(limits.items()) if value is not None]
+    return f"{endpoint}?{'&'.join(applied)}" if applied else endpoint
+
+def conditional_get(g, cache, repo_key, endpoint, url, parameters=None):
+    """GET url with the validators cached for endpoint. Returns (status, headers, data); 304 means unchanged."""
+    headers = {}
+    validators = cache.get_validators(repo_key, endpoint)
+    if validators:
+        etag, last_modified = validators
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    status, response_headers, body = call_with_rate_limit_retry(g.requester.requestJson, 'GET', url, parameters,
+                                                                headers)
+    data = json.loads(body) if body else None
+    if status >= 400:
+        raise g.requester.createException(status, response_headers, data)
+    return status, response_headers, data
+
+def fetch_cached_resource(g, cache, repo_key, endpoint, url, parameters=None):
+    """Return the JSON of a single-page resource, served from the cache when GitHub answers 304."""
+    status, headers, data = conditional_get(g, cache, repo_key, endpoint, url, parameters)
+    if status == 304:
+        return cache.load(repo_key, endpoint)[0]
+    cache.store(repo_key, endpoint, [data], headers.get('etag'), headers.get('last-modified'))
+    return data
+
+def fetch_cached_listing(g, cache, repo_key, endpoint, url, probe_parameters, fetch_function, key=None):
+    """Return a listing's raw JSON from the cache when a conditional probe of its first page comes back
+    304, otherwise fetch it with fetch_function (which returns raw JSON) and cache the result.
+
+    A listing that fails partway raises before anything is stored, so the cache keeps the last
+    complete copy together with its validators."""
+    status, headers, _ = conditional_get(g, cache, repo_key, endpoint, url, probe_parameters)
+    if status == 304:
+        print(f"{repo_key} {endpoint} not modified, using cached copy")
+        return cache.load(repo_key, endpoint)
+    raw_items = fetch_function()
+    cache.store(repo_key, endpoint, raw_items, headers.get('etag'), headers.get('last-modified'), key)
+    return raw_items
+
+def fetch_incremental_listing(g, cache, repo_key, endpoint, url, probe_parameters,
+                              fetch_function, fetch_since, watermark_of, key):
+    """Bring a cached listing up to date from its watermark.
+
+    Returns the raw JSON of (items, new_items, updated_items). Without a stored watermark the whole
+    listing is fetched and every item counts as new; otherwise only items changed since the
+    watermark are requested with fetch_since and merged into the cached listing. Nothing is stored,
+    and the watermark does not move, unless the fetch completed.
+    """
+    status, headers, _ = conditional_get(g, cache, repo_key, endpoint, url, probe_parameters)
+    watermark = cache.get_watermark(repo_key, endpoint)
+    if status == 304 and watermark is not None:
+        print(f"{repo_key} {endpoint} not modified, using cached copy")
+        return cache.load(repo_key, endpoint), [], []
+
+    if watermark is None:
+        raw_items = fetch_function()
+        cache.store(repo_key, endpoint, raw_items, headers.get('etag'), headers.get('last-modified'), key,
+                    watermark=max((watermark_of(raw) for raw in raw_items), default=None))
+        return raw_items, raw_items, []
+
+    raw_changed = fetch_since(parse_github_timestamp(watermark))
+    print(f"{repo_key} {endpoint}: {len(raw_changed)} items changed since {watermark}")
+    known = cache.merge(repo_key, endpoint, raw_changed, key, headers.get('etag'), headers.get('last-modified'),
+                        watermark=max([watermark] + [watermark_of(raw) for raw in raw_changed]))
+    new_items = [raw for raw in raw_changed if str(key(raw)) not in known]
+    updated_items = [raw for raw in raw_changed if str(key(raw)) in known]
+    return cache.load(repo_key, endpoint), new_items, updated_items
+
+def fetch_cached_pr_subresource(g, cache, repo_key, pr, resource, revalidate=True, per_page=DEFAULT_PER_PAGE):
+    """Return the raw JSON of one sub-resource of a PR, served from the cache when GitHub answers 304.
+
+    With revalidate=False a cached copy is returned without asking GitHub at all. per_page is the
+    client's page size.
+    """
+    method_name, path, _ = PR_SUBRESOURCES[resource]
+    endpoint = f"pulls/{pr.number}/{path}"
+    if not revalidate and cache.get_validators(repo_key, endpoint) is not None:
+        return cache.load(repo_key, endpoint)
+    status, headers, data = conditional_get(g, cache, repo_key, endpoint, f"{pr.url}/{path}", {'per_page': 100})
+    if status == 304:
+        return cache.load(repo_key, endpoint)
+    if 'rel="next"' in headers.get('link', ''):
+        # More than one page, let PyGithub walk the rest
+        data = fetch_paginated_data(getattr(pr, method_name), per_page=per_page, convert=raw_data_of)
+    cache.store(repo_key, endpoint, data, headers.get('etag'), headers.get('last-modified'))
+    return data
+
+def fetch_pr_subresources(pull_requests, resources=('reviews',), max_workers=MAX_SUBRESOURCE_WORKERS,
+                          g=None, cache=None, repo_key=None, refresh=None, per_page=DEFAULT_PER_PAGE):
+    """Fetch the given sub-resources of every PR as records with bounded concurrency, returned in PR order.
+
+    per_page must be the client's page size, so that a short page ends a listing without one more
+    request. When a cache is given (together with the Github client and repository key), each request is
+    made conditionally and unchanged sub-resources are loaded from the cache. If refresh is a set
+    of PR numbers, only those PRs are revalidated and the others are served straight from the cache.
+    """
+    unknown = set(resources) - set(PR_SUBRESOURCES)
+    if unknown:
+        raise ValueError(f"Unknown pull request sub-resources: {sorted(unknown)}")
+
+    def fetch_for_pr(pr):
+        fetched = {}
+        for resource in resources:
+            method_name, _, record_class = PR_SUBRESOURCES[resource]
+            try:
+                if cache is None:
+                    fetched[resource] = fetch_paginated_data(
+                        getattr(pr, method_name), per_page=per_page,
+                        convert=lambda item: record_class.from_raw(raw_data_of(item)))
+                else:
+                    raw_items = call_with_rate_limit_retry(
+                        fetch_cached_pr_subresource, g, cache, repo_key, pr, resource,
+                        revalidate=refresh is None or pr.number in refresh, per_page=per_page)
+                    fetched[resource] = [record_class.from_raw(raw) for raw in raw_items]
+            except Exception as e:
+                print(f"Error fetching {resource} for PR {pr.number}: {e}")
+                fetched[resource] = []
+        return fetched
+
+    if not pull_requests:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pull_requests)))) as executor:
+        return list(executor.map(fetch_for_pr, pull_requests))
+
+def fetch_sources_concurrently(sources, max_workers=MAX_FETCH_WORKERS):
+    """Run independent fetch functions in parallel, isolating errors and timing each source.
+
+    A source that fails partway keeps the items it got, and its error is reported all the same.
+    """
+    results = {}
+    errors = {}
+    timings = {}
+
+    def timed_fetch(name, fetch_function):
+        start = time.perf_counter()
+        try:
+            return fetch_function()
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as executor:
+        futures = {
+            executor.submit(timed_fetch, name, fetch_function): name
+            for name, fetch_function in sources.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except IncompleteListingError as e:
+                print(f"Incomplete {name}: {e}")
+                results[name] = e.items
+                errors[name] = str(e)
+            except Exception as e:
+                print(f"Error fetching {name}: {e}")
+                errors[name] = str(e)
+
+    for name in sources:
+        if name in timings:
+            print(f"Fetched {name} in {timings[name]:.2f}s")
+    return results, errors, timings
+
+class ProfileCache:
+    """Owner profiles by login, reused for `ttl` seconds by every fetch sharing the cache.
+
+    Concurrent requests for the same login wait for the fetch already in flight instead of
+    starting another one.
+    """
+    def __init__(self, ttl=PROFILE_TTL, max_entries=PROFILE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()  # lowercased login -> (expiry time, profile)
+        self._in_flight = {}  # lowercased login -> Future of the running fetch
+        self._lock = threading.Lock()
+
+    def get(self, login, fetch_profile):
+        """Return the cached profile of a login, or fetch it with fetch_profile(login)."""
+        key = login.lower()
+        with self._lock:
+            cached = self._profiles.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._profiles.move_to_end(key)
+                return cached[1]
+            future = self._in_flight.get(key)
+            fetching = future is None
+            if fetching:
+                future = self._in_flight[key] = Future()
+        if not fetching:
+            return future.result()
+
+        try:
+            profile = fetch_profile(login)
         except Exception as e:
-            print(f"Error fetching data on page {page}: {e}")
-            break
-    return all_items
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._profiles[key] = (time.monotonic() + self.ttl, profile)
+            self._profiles.move_to_end(key)
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+            del self._in_flight[key]
+        future.set_result(profile)
+        return profile
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+def fetch_profiles(logins, fetch_profile, profile_cache=None, max_workers=MAX_FETCH_WORKERS):
+    """Fetch the profiles of several logins side by side, each login once.
+
+    Logins differing only in case are the same account; the first spelling is kept. Returns a dict
+    from login to profile in the given order, with None for profiles that could not be fetched.
+    """
+    unique_logins, seen = [], set()
+    for login in logins:
+        if login and login.lower() not in seen:
+            seen.add(login.lower())
+            unique_logins.append(login)
+    if not unique_logins:
+        return {}
+    if profile_cache is not None:
+        fetch = lambda login: profile_cache.get(login, fetch_profile)
+    else:
+        fetch = fetch_profile
 
-def collect_github_data(repo_url, token, second_owner_login=None):
-    g = Github(token)
-    repo = g.get_repo(repo_url)
+    profiles = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique_logins)))) as executor:
+        futures = {executor.submit(fetch, login): login for login in unique_logins}
+        for future in as_completed(futures):
+            login = futures[future]
+            try:
+                profiles[login] = future.result()
+            except Exception as e:
+                print(f"Error fetching profile of {login}: {e}")
+                profiles[login] = None
+    return {login: profiles[login] for login in unique_logins}
+
+def collect_github_data(repo_url, token, second_owner_login=None, pr_subresources=('reviews',),
+                        max_subresource_workers=MAX_SUBRESOURCE_WORKERS, cache=None, incremental=False,
+                        per_page=DEFAULT_PER_PAGE, max_items=None, since=None, scheduler=None,
+                        compare_logins=(), profile_cache=None, pull_requests_from_issue_listing=False,
+                        base_url=None, seconds_between_requests=SECONDS_BETWEEN_REQUESTS):
+    # With pull_requests_from_issue_listing, pull requests are read from the issues listing, which
+    # returns them anyway, instead of listing them a second time from the pulls endpoint
+    if incremental and cache is None:
+        raise ValueError("Incremental sync needs a cache to keep the previous dataset in")
+    if not 1 <= per_page <= 100:
+        raise ValueError("per_page must be between 1 and 100")
+
+    # base_url points the client at GitHub Enterprise or at a local stand-in such as github_replay's
+    if scheduler is None:
+        g = Github(token, base_url=base_url or Consts.DEFAULT_BASE_URL, per_page=per_page,
+                   seconds_between_requests=seconds_between_requests)
+    else:
+        # The scheduler paces requests itself, so PyGithub's fixed delay between requests is not needed.
+        # PyGithub's retry would sleep until the reset and resend with the same token, so rate limits
+        # are raised instead and call_with_rate_limit_retry moves the request to another token
+        g = Github(auth=PooledTokenAuth(scheduler), base_url=base_url or scheduler.base_url, per_page=per_page,
+                   seconds_between_requests=None, retry=GithubRetry(max_rate_limit_wait=POOLED_RATE_LIMIT_WAIT))
+    if cache is None:
+        repo = call_with_rate_limit_retry(g.get_repo, repo_url)
+    else:
+        repo = g.create_from_raw_data(
+            Repository, fetch_cached_resource(g, cache, repo_url, 'repository', f"/repos/{repo_url}"))
 
     def fetch_commits():
-        return repo.get_commits()
+        # Author dates are not in listing order (rebased and cherry-picked commits keep theirs),
+        # so since is applied by GitHub rather than by stopping at the first older commit
+        if since is None:
+            return repo.get_commits()
+        return repo.get_commits(since=since)
 
     def fetch_pull_requests():
         return repo.get_pulls(state='all', sort='created', direction='desc')
@@ -38,14 +473,65 @@ def collect_github_data(repo_url, token, second_owner_login=None):
         return repo.get_issues(state='all', sort='created', direction='desc')
 
     def fetch_languages():
-        return repo.get_languages()
+        return call_with_rate_limit_retry(repo.get_languages)
 
-    def fetch_contributors():
+    def fetch_contributors(convert):
         # Fetch contributors with a page limit to avoid high load
-        return fetch_paginated_data(repo.get_contributors)
+        return fetch_paginated_data(repo.get_contributors, per_page=per_page, max_pages=MAX_CONTRIBUTORS_PAGES,
+                                    convert=convert)
+
+    def paginate(fetch_function, date_of, convert):
+        return fetch_paginated_data(fetch_function, per_page=per_page, max_items=max_items,
+                                    since=since, date_of=date_of, convert=convert)
+
+    def fetch_commits_since(watermark):
+        return [raw_data_of(commit) for commit in iter_paginated(repo.get_commits(since=watermark), per_page)]
+
+    def fetch_pull_requests_since(watermark):
+        # The pulls endpoint has no since filter, so walk it newest-updated
+        # first and stop at the first pull request older than the watermark
+        updated_first = iter_paginated(repo.get_pulls(state='all', sort='updated', direction='desc'), per_page)
+        return [raw_data_of(pr) for pr in takewhile(lambda pr: pr.updated_at >= watermark, updated_first)]
+
+    def fetch_issues_since(watermark):
+        return [raw_data_of(issue) for issue in iter_paginated(
+            repo.get_issues(state='all', since=watermark, sort='updated', direction='desc'), per_page)]
+
+    # Keys of the new and updated items per listing, filled in by incremental fetches
+    delta = {}
+
+    def fetch_cached(endpoint, probe_parameters, fetch_function, to_record, key=None, name=None,
+                     fetch_since=None, watermark_of=None, limits=None):
+        # fetch_function(convert) fetches the listing, converting each item as its page arrives.
+        # Without a cache items go straight to records; with one their raw JSON is kept until
+        # the complete listing is stored, then converted
+        if cache is None:
+            return fetch_function(lambda item: to_record(raw_data_of(item)))
+        url = f"{repo.url}/{endpoint}"
+        if limits is None:
+            limits = {'max_items': max_items, 'since': since}
+        cache_key = listing_cache_key(endpoint, **limits)
+        try:
+            if incremental and fetch_since is not None:
+                raw_items, new_items, updated_items = fetch_incremental_listing(
+                    g, cache, repo_url, cache_key, url, probe_parameters,
+                    lambda: fetch_function(raw_data_of), fetch_since, watermark_of, key)
+                delta[name] = {'new': [key(raw) for raw in new_items],
+                               'updated': [key(raw) for raw in updated_items]}
+            else:
+                raw_items = fetch_cached_listing(g, cache, repo_url, cache_key, url, probe_parameters,
+                                                 lambda: fetch_function(raw_data_of), key)
+        except IncompleteListingError as e:
+            e.items = [to_record(raw) for raw in e.items]
+            raise
+        return [to_record(raw) for raw in raw_items]
 
     def fetch_profile_data(username):
-        user = g.get_user(username)
+        if cache is None:
+            user = call_with_rate_limit_retry(g.get_user, username)
+        else:
+            user = g.create_from_raw_data(
+                NamedUser, fetch_cached_resource(g, cache, '', f"users/{username}", f"/users/{username}"))
         profile_data = {
             'login': user.login,
             'name': user.name,
@@ -72,40 +558,92 @@ def collect_github_data(repo_url, token, second_owner_login=None):
     }
 
     try:
-        commits = fetch_paginated_data(fetch_commits)
-        pull_requests = fetch_paginated_data(fetch_pull_requests)
-        issues = fetch_paginated_data(fetch_issues)
-        languages = fetch_languages()
-        contributors = fetch_contributors()
-
-        # Fetch code reviews for each pull request
-        for pr in pull_requests:
-            try:
-                reviews = pr.get_reviews()
-                pr.reviews = list(reviews)  # Convert to list for easy processing
-            except Exception as e:
-                print(f"Error fetching reviews for PR {pr.number}: {e}")
-
-        # Fetch profile data for repository owner
-        owner_profile = fetch_profile_data(repo.owner.login)
-        
-        # Fetch profile data for the second owner if provided
-        second_owner_profile = None
-        if second_owner_login:
-            with ThreadPoolExecutor(max_workers=2) as executor:
-                futures = {
-                    executor.submit(fetch_profile_data, repo.owner.login): 'first_owner',
-                    executor.submit(fetch_profile_data, second_owner_login): 'second_owner'
-                }
-                results = {}
-                for future in futures:
-                    owner_type = futures[future]
-                    try:
-                        results[owner_type] = future.result()
-                    except Exception as e:
-                        print(f"Error fetching {owner_type} profile: {e}")
-
-            second_owner_profile = results.get('second_owner')
+        # Each listing is independent, so fetch them side by side and keep
+        # whatever succeeded even if one of them fails. With a cache, each
+        # listing is first probed with a conditional request on a page sorted
+        # so that any change to the listing changes that page's ETag
+        updated_first = {'state': 'all', 'sort': 'updated', 'direction': 'desc', 'per_page': 1}
+        sources = {
+            'commits': lambda: fetch_cached(
+                'commits', {'per_page': 1},
+                lambda convert: fetch_paginated_data(fetch_commits, per_page=per_page, max_items=max_items,
+                                                     convert=convert),
+                CommitRecord.from_raw,
+                key=lambda raw: raw['sha'],
+                name='commits', fetch_since=fetch_commits_since,
+                watermark_of=lambda raw: (raw['commit'].get('committer') or raw['commit']['author'])['date']),
+            'issues': lambda: fetch_cached(
+                'issues', updated_first,
+                lambda convert: paginate(fetch_issues, lambda issue: issue.created_at, convert),
+                issue_or_pull_request,
+                key=lambda raw: raw['number'],
+                name='issues', fetch_since=fetch_issues_since,
+                watermark_of=lambda raw: raw['updated_at']),
+            'languages': lambda: fetch_languages() if cache is None else fetch_cached_resource(
+                g, cache, repo_url, 'languages', f"{repo.url}/languages"),
+            # Only MAX_CONTRIBUTORS_PAGES pages of contributors are fetched, so the page size caps them
+            'contributors': lambda: fetch_cached(
+                'contributors', {'per_page': 100}, fetch_contributors, ContributorRecord.from_raw,
+                limits={'per_page': per_page if per_page != DEFAULT_PER_PAGE else None}),
+        }
+        if not pull_requests_from_issue_listing:
+            sources['pull_requests'] = lambda: fetch_cached(
+                'pulls', updated_first,
+                lambda convert: paginate(fetch_pull_requests, lambda pr: pr.created_at, convert),
+                PullRequestRecord.from_raw,
+                key=lambda raw: raw['number'],
+                name='pull_requests', fetch_since=fetch_pull_requests_since,
+                watermark_of=lambda raw: raw['updated_at'])
+        listings, fetch_errors, fetch_timings = fetch_sources_concurrently(sources)
+        commits = listings.get('commits', [])
+        pull_requests = listings.get('pull_requests', [])
+
+        # The issues listing includes pull requests; they never count as issues, and in
+        # pull_requests_from_issue_listing mode they are the pull requests
+        issue_items = listings.get('issues', [])
+        issues = [item for item in issue_items if isinstance(item, IssueRecord)]
+        if pull_requests_from_issue_listing:
+            pr_raws = [item for item in issue_items if not isinstance(item, IssueRecord)]
+            complete_merged_at(g, pr_raws, max_subresource_workers, cache, repo_url)
+            pull_requests = [PullRequestRecord.from_raw(pr_raw) for pr_raw in pr_raws]
+            if 'issues' in delta:
+                # Issues and pull requests share one numbering, so the issues delta covers both
+                delta['pull_requests'] = delta['issues']
+        languages = listings.get('languages', {})
+        contributors = listings.get('contributors', [])
+
+        # Fetch code reviews (and any other requested sub-resources) for each pull request
+        # In incremental mode only pull requests that changed since the last
+        # sync need their sub-resources revalidated
+        refresh = None
+        if 'pull_requests' in delta:
+            refresh = set(delta['pull_requests']['new'] + delta['pull_requests']['updated'])
+        # Listing sub-resources only needs each pull request's number and API URL
+        pr_stubs = [g.create_from_raw_data(PullRequest, {'number': pr.number, 'url': f"{repo.url}/pulls/{pr.number}"})
+                    for pr in pull_requests]
+        subresources = fetch_pr_subresources(pr_stubs, pr_subresources, max_subresource_workers,
+                                             g=g, cache=cache, repo_key=repo_url, refresh=refresh,
+                                             per_page=per_page)
+        for pr, fetched in zip(pull_requests, subresources):
+            pr.reviews = tuple(fetched.get('reviews', ()))
+
+        records_by_key = {
+            'commits': {commit.sha: commit for commit in commits},
+            'pull_requests': {pr.number: pr for pr in pull_requests},
+            'issues': {issue.number: issue for issue in issues},
+        }
+        for name, changes in delta.items():
+            delta[name] = {
+                change: [records_by_key[name][key] for key in keys if key in records_by_key[name]]
+                for change, keys in changes.items()
+            }
+
+        # Fetch the profiles of the repository owner and everyone compared with it, each once
+        compared = [login for login in (second_owner_login, *compare_logins) if login]
+        profiles = fetch_profiles([repo.owner.login, *compared], fetch_profile_data, profile_cache)
+        owner_profile = profiles[repo.owner.login]
+        profile_of = {login.lower(): profile for login, profile in profiles.items()}
+        second_owner_profile = profile_of[compared[0].lower()] if compared else None
 
         return {
             'repo_info': repo_info,
@@ -114,8 +652,13 @@ def collect_github_data(repo_url, token, second_owner_login=None):
             'issues': issues,
             'languages': languages,
             'contributors': contributors,
+            'pr_subresources': {pr.number: fetched for pr, fetched in zip(pull_requests, subresources)},
             'owner_profile': owner_profile,
-            'second_owner_profile': second_owner_profile
+            'second_owner_profile': second_owner_profile,
+            'profiles': profiles,
+            'delta': delta if incremental else None,
+            'fetch_errors': fetch_errors,
+            'fetch_timings': fetch_timings
         }
     except Exception as e:
         print(f"Error fetching data: {e}")
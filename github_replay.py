@@ -0,0 +1,337 @@
+"""Record GitHub API responses into a cassette and replay them from a local stand-in server.
+
+Record (needs a token and network access):
+    python github_replay.py record owner/repo cassettes/owner__repo.json
+Replay:
+    python github_replay.py serve cassettes/owner__repo.json --latency 0.05
+
+While serving, pass the printed address as collect_github_data(..., base_url=...), or run
+benchmark_fetch.py, which starts its own stand-in. Responses are matched on method, path and query
+string, so a replayed fetch has to use the parameters (per page, item cap, listing mode) of a recorded
+one. Addresses of the recorded API inside responses are stored as a placeholder and replaced by the
+stand-in's own address, so PyGithub keeps following links to the stand-in.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from github_cache import GithubCache
+from github_data import collect_github_data
+
+GITHUB_API_URL = 'https://api.github.com'
+BASE_URL_PLACEHOLDER = '{{base_url}}'
+RECORDED_HEADERS = ('content-type', 'etag', 'last-modified', 'link')  # Response headers kept in a cassette
+FORWARDED_HEADERS = ('Authorization', 'Accept', 'User-Agent', 'If-None-Match', 'If-Modified-Since')
+CASSETTE_VERSION = 1
+RATE_LIMIT_WINDOW = 3600  # Seconds until an injected rate limit resets, as on GitHub
+UNLIMITED_QUOTA = 5000  # Quota reported by /rate_limit when no rate limit is injected
+
+def request_key(method, path):
+    """Key of a request in a cassette: the method, the path and the query sorted by parameter."""
+    parts = urlsplit(path)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method} {parts.path}?{query}" if query else f"{method} {parts.path}"
+
+class Cassette:
+    """Recorded responses by request key, saved as one JSON file."""
+
+    def __init__(self, interactions=None, recorded_from=GITHUB_API_URL):
+        self.interactions = interactions or {}  # request key -> {'status', 'headers', 'body'}
+        self.recorded_from = recorded_from
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.interactions)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as cassette_file:
+            stored = json.load(cassette_file)
+        if stored.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {stored.get('version')} in '{path}'")
+        return cls(stored['interactions'], stored.get('recorded_from', GITHUB_API_URL))
+
+    def save(self, path):
+        # Written next to the target and renamed, so an interrupted recording never leaves half a cassette
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            stored = {'version': CASSETTE_VERSION, 'recorded_from': self.recorded_from,
+                      'interactions': dict(sorted(self.interactions.items()))}
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.cassette-', suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as cassette_file:
+                json.dump(stored, cassette_file, indent=1)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    def add(self, key, status, headers, body):
+        with self._lock:
+            self.interactions[key] = {'status': status, 'headers': headers, 'body': body}
+
+    def get(self, key):
+        return self.interactions.get(key)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the connections PyGithub keeps to GitHub
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        status, headers, body = self.server.stand_in.respond(self)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class _StandIn:
+    """A local HTTP server on a free port, answering GET requests with respond(handler)."""
+
+    def __init__(self, port=0):
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = None
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def count(self, outcome):
+        with self._stats_lock:
+            self.stats[outcome] += 1
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def respond(self, handler):
+        raise NotImplementedError
+
+class ReplayServer(_StandIn):
+    """Serves a cassette, optionally slowed down, rate limited or failing.
+
+    - latency, jitter: seconds added to every response, jitter drawn uniformly per request.
+    - rate_limit: requests allowed per rate_limit_window seconds before GitHub's rate limit response is
+      sent; 304 responses do not count, as on GitHub. Every Authorization header has its own quota,
+      so a token pool can be measured against a single token. None sends no rate limit headers at all.
+    - error_rate: share of requests answered with error_status instead of the recording.
+    - seed: makes jitter and injected errors repeat from run to run.
+    Conditional requests whose If-None-Match matches the recorded ETag get a 304.
+    """
+
+    def __init__(self, cassette, latency=0.0, jitter=0.0, rate_limit=None, error_rate=0.0, error_status=502,
+                 seed=0, port=0, rate_limit_window=RATE_LIMIT_WINDOW):
+        super().__init__(port)
+        self.cassette = Cassette.load(cassette) if isinstance(cassette, str) else cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.rate_limit_window = rate_limit_window
+        self._quotas = {}  # Authorization header ('' for anonymous requests) -> [remaining, reset time]
+        self._quota_lock = threading.Lock()
+
+    def _use_quota(self, handler, spend=True):
+        """Return (limited, rate limit headers) for the request's credentials, spending one request if spend.
+
+        A quota's window starts with the first request made with it, as on GitHub.
+        """
+        if self.rate_limit is None:
+            return False, {}
+        credentials = handler.headers.get('Authorization', '')
+        with self._quota_lock:
+            now = time.time()
+            quota = self._quotas.get(credentials)
+            if quota is None or now >= quota[1]:
+                quota = self._quotas[credentials] = [self.rate_limit, now + self.rate_limit_window]
+            limited = spend and quota[0] <= 0
+            if spend and not limited:
+                quota[0] -= 1
+            remaining, reset_at = quota
+        # Rounded up, so a client waiting until the reset never comes back before it
+        return limited, {'X-RateLimit-Limit': str(self.rate_limit), 'X-RateLimit-Remaining': str(remaining),
+                         'X-RateLimit-Reset': str(math.ceil(reset_at)), 'X-RateLimit-Resource': 'core'}
+
+    def _json(self, status, payload, headers=None):
+        headers = {'Content-Type': 'application/json; charset=utf-8', **(headers or {})}
+        return status, headers, json.dumps(payload).encode()
+
+    def respond(self, handler):
+        key = request_key('GET', handler.path)
+        with self._random_lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            failing = self.error_rate and self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+
+        interaction = self.cassette.get(key)
+        if interaction is None and urlsplit(handler.path).path == '/rate_limit':
+            # Quota checks are answered from the injected limit when none was recorded
+            _, headers = self._use_quota(handler, spend=False)
+            limit = int(headers.get('X-RateLimit-Limit', UNLIMITED_QUOTA))
+            remaining = int(headers.get('X-RateLimit-Remaining', UNLIMITED_QUOTA))
+            reset = int(headers.get('X-RateLimit-Reset', math.ceil(time.time() + self.rate_limit_window)))
+            core = {'limit': limit, 'remaining': remaining, 'reset': reset, 'used': limit - remaining}
+            self.count('rate_limit_checks')
+            return self._json(200, {'resources': {'core': core}, 'rate': core}, headers)
+        if failing:
+            self.count('errors')
+            _, headers = self._use_quota(handler, spend=False)
+            return self._json(self.error_status, {'message': 'Injected error'}, headers)
+        if interaction is None:
+            self.count('missing')
+            print(f"Not in cassette: {key}")
+            return self._json(404, {'message': 'Not Found', 'documentation_url': f"not recorded: {key}"})
+
+        headers = {name: value.replace(BASE_URL_PLACEHOLDER, self.base_url)
+                   for name, value in interaction['headers'].items()}
+        etag = headers.get('etag')
+        if etag is not None and handler.headers.get('If-None-Match') == etag:
+            self.count('not_modified')
+            return 304, {'ETag': etag, **self._use_quota(handler, spend=False)[1]}, b''
+
+        limited, rate_limit_headers = self._use_quota(handler)
+        if limited:
+            self.count('rate_limited')
+            return self._json(403, {'message': 'API rate limit exceeded (injected)'}, rate_limit_headers)
+        self.count('served')
+        body = interaction['body'].replace(BASE_URL_PLACEHOLDER, self.base_url).encode()
+        return interaction['status'], {**headers, **rate_limit_headers}, body
+
+class RecordingProxy(_StandIn):
+    """Forwards requests to the real API and records every response except 304s into a cassette.
+
+    The token travels in the forwarded Authorization header and is never written to the cassette.
+    """
+
+    def __init__(self, cassette, upstream=GITHUB_API_URL, port=0):
+        super().__init__(port)
+        self.cassette = cassette
+        self.upstream = upstream.rstrip('/')
+        self.cassette.recorded_from = self.upstream
+
+    def respond(self, handler):
+        request = urllib.request.Request(self.upstream + handler.path, headers={
+            name: handler.headers[name] for name in FORWARDED_HEADERS if handler.headers.get(name)})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                status, headers, body = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            status, headers, body = e.code, e.headers, e.read()
+
+        text = body.decode('utf-8', errors='replace')
+        kept_headers = {name: headers[name] for name in RECORDED_HEADERS if headers.get(name)}
+        if status != 304:
+            self.count('recorded')
+            self.cassette.add(request_key('GET', handler.path), status,
+                              {name: value.replace(self.upstream, BASE_URL_PLACEHOLDER)
+                               for name, value in kept_headers.items()},
+                              text.replace(self.upstream, BASE_URL_PLACEHOLDER))
+        # The client sees the proxy's address in place of the upstream one, so it keeps coming back here
+        client_headers = {name: value.replace(self.upstream, self.base_url) for name, value in kept_headers.items()}
+        for name in ('X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset'):
+            if headers.get(name):
+                client_headers[name] = headers[name]
+        if status == 304:
+            return status, client_headers, b''
+        return status, client_headers, text.replace(self.upstream, self.base_url).encode()
+
+def record_repository(repo, cassette_path, token=None, upstream=GITHUB_API_URL, **fetch_options):
+    """Record everything collect_github_data requests for a repository into a cassette.
+
+    The repository is fetched with pull requests read from the issues listing and from the pulls
+    listing, each without and with a fresh conditional-request cache, so every fetch mode can be
+    replayed. Returns the cassette, which is also saved to cassette_path.
+    """
+    cassette = Cassette.load(cassette_path) if os.path.exists(cassette_path) else Cassette()
+    with RecordingProxy(cassette, upstream) as proxy, tempfile.TemporaryDirectory() as cache_directory:
+        for single_listing in (True, False):
+            for use_cache in (False, True):
+                cache = GithubCache(os.path.join(cache_directory, f"{single_listing}.sqlite3")) if use_cache else None
+                print(f"Recording {repo} (pull requests from the issues listing: {single_listing}, cache: {use_cache})")
+                data = collect_github_data(repo, token, base_url=proxy.base_url, cache=cache,
+                                           pull_requests_from_issue_listing=single_listing, **fetch_options)
+                if cache is not None:
+                    cache.close()
+                if not data:
+                    raise RuntimeError(f"Recording {repo} failed, see the errors above")
+    cassette.save(cassette_path)
+    print(f"Saved {len(cassette)} responses to '{cassette_path}'")
+    return cassette
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="Fetch a repository through a recording proxy")
+    record.add_argument('repo', help="owner/repo")
+    record.add_argument('cassette', help="Cassette file; responses are added to it if it exists")
+    record.add_argument('--upstream', default=GITHUB_API_URL, help="API to record, e.g. a GitHub Enterprise URL")
+    record.add_argument('--per-page', type=int, default=100)
+    record.add_argument('--max-items', type=int, default=None, help="Cap on items per listing")
+
+    serve = commands.add_parser('serve', help="Serve a cassette until interrupted")
+    serve.add_argument('cassette')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    serve.add_argument('--jitter', type=float, default=0.0, help="Extra random seconds per response, at most")
+    serve.add_argument('--rate-limit', type=int, default=None, help="Requests allowed per window")
+    serve.add_argument('--rate-limit-window', type=float, default=RATE_LIMIT_WINDOW, help="Seconds per window")
+    serve.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with a 502")
+    serve.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        token = os.environ.get('GITHUB_TOKEN')
+        if not token:
+            print("GITHUB_TOKEN is not set, recording without authentication (60 requests per hour)")
+        record_repository(args.repo, args.cassette, token, args.upstream, per_page=args.per_page,
+                          max_items=args.max_items)
+        return
+
+    server = ReplayServer(args.cassette, latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                          error_rate=args.error_rate, seed=args.seed, port=args.port,
+                          rate_limit_window=args.rate_limit_window)
+    with server:
+        print(f"Serving {len(server.cassette)} recorded responses at {server.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
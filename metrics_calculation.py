@@ -1,161 +1,454 @@
+import heapq
 import pandas as pd
+from collections import Counter
+from collections.abc import Mapping
+from functools import partial
+from itertools import chain
+from operator import attrgetter
+from pandas.tseries.frequencies import to_offset
 
-def calculate_commit_frequency(commits):
-    if not commits:
-        return pd.Series()
-    
-    df_commits = pd.DataFrame([{
-        'sha': commit.sha,
-        'date': commit.commit.author.date
-    } for commit in commits if hasattr(commit.commit, 'author') and hasattr(commit.commit.author, 'date')])
-    
-    if df_commits.empty:
+from records import CommitRecord, IssueRecord, PullRequestRecord
+
+TOP_ISSUES_COUNT = 10
+
+# Fields each entity frame is built from; every metric is computed from these columns
+COMMIT_FIELDS = ('sha', 'author', 'date')
+PULL_REQUEST_FIELDS = ('title', 'state', 'author', 'created_at', 'merged_at')
+ISSUE_FIELDS = ('title', 'state', 'author', 'labels', 'comments', 'created_at', 'closed_at')
+DATE_FIELDS = ('date', 'created_at', 'closed_at', 'merged_at')
+ENTITY_FIELDS = {'commits': COMMIT_FIELDS, 'pull_requests': PULL_REQUEST_FIELDS, 'issues': ISSUE_FIELDS}
+
+# Granularities of the commit cube and the resample rule behind each; periods are labelled by their first day
+GRANULARITIES = {'day': 'D', 'week': 'W-MON', 'month': 'MS', 'quarter': 'QS'}
+
+def build_frame(records, fields):
+    # One pass over the records, then one typed column per field
+    rows = list(map(attrgetter(*fields), records))
+    frame = pd.DataFrame.from_records(rows, columns=list(fields))
+    for field in fields:
+        if field in DATE_FIELDS:
+            frame[field] = pd.to_datetime(frame[field], utc=True)
+    return frame
+
+def issues_only(issues):
+    # The issues endpoint also lists pull requests; those are counted by the pull request metrics only
+    return [issue for issue in issues if not issue.is_pull_request]
+
+def build_entity_frame(data, name):
+    records = data.get(name) or []
+    if name == 'issues':
+        records = issues_only(records)
+    return build_frame(records, ENTITY_FIELDS[name])
+
+def build_frames(data):
+    return {name: build_entity_frame(data, name) for name in ENTITY_FIELDS}
+
+class RecordFrames(Mapping):
+    """The entity frames of a dataset, each built the first time it is read.
+
+    Only filtered queries read them, so metrics updated from a delta do not turn the whole history
+    into frames on every sync.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._frames = {}
+
+    def __getitem__(self, name):
+        if name not in self._frames:
+            if name not in ENTITY_FIELDS:
+                raise KeyError(name)
+            self._frames[name] = build_entity_frame(self._data, name)
+        return self._frames[name]
+
+    def __iter__(self):
+        return iter(ENTITY_FIELDS)
+
+    def __len__(self):
+        return len(ENTITY_FIELDS)
+
+def commit_frequency_from_frame(df_commits):
+    dates = df_commits['date'].dropna()
+    if dates.empty:
         return pd.Series()
-    
-    df_commits['date'] = pd.to_datetime(df_commits['date'])
-    df_commits.set_index('date', inplace=True)
-    daily_commits = df_commits.resample('D').size()
-    
-    return daily_commits
+    return pd.Series(1, index=pd.DatetimeIndex(dates, name='date')).resample('D').size()
 
-def calculate_pr_merge_rate(pull_requests):
-    if not pull_requests:
-        return {
-            'total_prs': 0,
-            'merged_prs': 0,
-            'merge_rate': 0
-        }
-    
-    df_prs = pd.DataFrame([{
-        'title': pr.title,
-        'state': pr.state,
-        'merged_at': pr.merged_at
-    } for pr in pull_requests if hasattr(pr, 'state') and hasattr(pr, 'title')])
-    
-    if df_prs.empty:
-        return {
-            'total_prs': 0,
-            'merged_prs': 0,
-            'merge_rate': 0
-        }
-    
+def pr_merge_rate_from_frame(df_prs):
     total_prs = len(df_prs)
-    merged_prs = len(df_prs[df_prs['state'] == 'closed'])
-    
+    merged_prs = int((df_prs['state'] == 'closed').sum())
     return {
         'total_prs': total_prs,
         'merged_prs': merged_prs,
         'merge_rate': merged_prs / total_prs if total_prs > 0 else 0
     }
 
-def calculate_issue_resolution_time(issues):
-    if not issues:
-        return 0
-    
-    df_issues = pd.DataFrame([{
-        'title': issue.title,
-        'created_at': issue.created_at,
-        'closed_at': issue.closed_at
-    } for issue in issues if issue.closed_at is not None and hasattr(issue, 'created_at')])
-    
-    if df_issues.empty:
-        return 0
-    
-    df_issues['created_at'] = pd.to_datetime(df_issues['created_at'])
-    df_issues['closed_at'] = pd.to_datetime(df_issues['closed_at'])
-    df_issues['resolution_time'] = (df_issues['closed_at'] - df_issues['created_at']).dt.days
-    
-    average_resolution_time = df_issues['resolution_time'].mean()
-    
-    return average_resolution_time
+def closed_issue_days_from_frame(df_issues):
+    closed = df_issues['closed_at'].notna() & df_issues['created_at'].notna()
+    return (df_issues['closed_at'][closed] - df_issues['created_at'][closed]).dt.days
 
-def calculate_contributor_activity(commits):
-    if not commits:
-        return pd.Series()
-    
-    df_commits = pd.DataFrame([{
-        'sha': commit.sha,
-        'author': commit.commit.author.name
-    } for commit in commits if hasattr(commit.commit, 'author') and hasattr(commit.commit.author, 'name')])
-    
-    if df_commits.empty:
+def mean_or_zero(days):
+    return days.mean() if not days.empty else 0
+
+def contributor_activity_from_frame(df_commits):
+    authors = df_commits['author'].dropna()
+    if authors.empty:
         return pd.Series()
-    
-    contributor_activity = df_commits['author'].value_counts()
-    
-    return contributor_activity
+    return authors.value_counts()
 
-def calculate_top_issues(issues):
-    if not issues:
-        return pd.DataFrame()
-    
-    df_issues = pd.DataFrame([{
-        'title': issue.title,
-        'comments': issue.comments
-    } for issue in issues if hasattr(issue, 'comments')])
-    
+def top_issues_from_frame(df_issues):
     if df_issues.empty:
         return pd.DataFrame()
-    
-    top_issues = df_issues.sort_values(by='comments', ascending=False)
-    
-    return top_issues.head(10)  # Top 10 issues
+    return df_issues[['title', 'comments']].nlargest(TOP_ISSUES_COUNT, 'comments')
+
+def pr_review_days_from_frame(df_prs):
+    merged = df_prs['merged_at'].notna() & df_prs['created_at'].notna()
+    return (df_prs['merged_at'][merged] - df_prs['created_at'][merged]).dt.days
+
+class CommitCube:
+    """Commit counts pre-aggregated per day, week, month and quarter, in total and per author.
+
+    Built once after a fetch from daily counts, so changing the date range or granularity on the
+    dashboard is a slice of a sorted index instead of a resample over the raw commits. The per-author
+    counts of a granularity are rolled up the first time they are read. Dates are naive UTC.
+    """
+
+    def __init__(self, totals, by_author, authors=None):
+        self.totals = totals  # granularity -> Series indexed by 'date'
+        self.by_author = by_author  # granularity -> Series indexed by ('author', 'date')
+        self._authors = authors
+        self._author_series = {}  # (granularity, author) -> Series, split off on first use
+
+    @classmethod
+    def from_frame(cls, df_commits):
+        dates = df_commits['date'].dropna()
+        days = dates.dt.tz_localize(None).dt.floor('D') if not dates.empty else dates
+        authors = df_commits['author'][dates.index].fillna('')
+        daily = days.value_counts().sort_index()
+        daily_by_author = pd.Series(1, index=pd.MultiIndex.from_arrays([authors, days])).groupby(level=[0, 1]).size()
+        return cls.from_daily(daily, daily_by_author)
+
+    @classmethod
+    def from_daily(cls, daily, daily_by_author=None, authors=None):
+        """Build the cube from a daily count series and, optionally, daily counts indexed by (author, date).
+
+        daily_by_author may also be a function returning those counts. The per-author counts are
+        only rolled up (and the function called) when they are first read; authors, when given,
+        lists the authors without reading them.
+        """
+        daily = daily.astype('int64')
+        daily.index = pd.DatetimeIndex(daily.index, name='date')
+        if daily.index.tz is not None:
+            daily.index = daily.index.tz_localize(None)
+
+        totals = {}
+        for granularity, rule in GRANULARITIES.items():
+            if daily.empty:
+                totals[granularity] = daily
+            else:
+                totals[granularity] = daily.resample(rule, label='left', closed='left').sum()
+        return cls(totals, _AuthorRollups(daily_by_author), authors)
+
+    @property
+    def authors(self):
+        if self._authors is None:
+            self._authors = list(self.by_author['day'].index.unique(level='author'))
+        return self._authors
+
+    def series(self, granularity='day', start=None, end=None, author=None):
+        """Return commit counts at a granularity between two dates (inclusive), for everyone or one author."""
+        if author is None:
+            counts = self.totals[granularity]
+        else:
+            if (granularity, author) not in self._author_series:
+                by_author = self.by_author[granularity]
+                if author in by_author.index.get_level_values('author'):
+                    counts = by_author.xs(author, level='author')
+                else:
+                    counts = pd.Series(dtype='int64', index=pd.DatetimeIndex([], name='date'))
+                self._author_series[granularity, author] = counts
+            counts = self._author_series[granularity, author]
+        if start is not None:
+            # Buckets are labelled by their first day, so a start inside a bucket has to be rolled
+            # back to that day or the bucket it falls in would be left out
+            start = to_offset(GRANULARITIES[granularity]).rollback(pd.Timestamp(start).normalize())
+        end = pd.Timestamp(end) if end is not None else None
+        return counts.loc[start:end]
+
+class _AuthorRollups(dict):
+    """Per-author commit counts by granularity, each rolled up from the daily counts on first use."""
+
+    def __init__(self, daily_by_author):
+        super().__init__()
+        self._source = daily_by_author  # Series, function returning one, or None
+        self._daily = None
+
+    def __missing__(self, granularity):
+        rule = GRANULARITIES[granularity]
+        daily_by_author = self._daily_counts()
+        if daily_by_author.empty:
+            counts = daily_by_author
+        else:
+            counts = daily_by_author.groupby(
+                [pd.Grouper(level='author'), pd.Grouper(level='date', freq=rule, label='left', closed='left')]
+            ).sum().sort_index()
+        self[granularity] = counts
+        return counts
+
+    def _daily_counts(self):
+        if self._daily is None:
+            daily_by_author = self._source() if callable(self._source) else self._source
+            if daily_by_author is None:
+                daily_by_author = pd.Series(dtype='int64', index=pd.MultiIndex.from_arrays([[], []]))
+            daily_by_author = daily_by_author.astype('int64')
+            daily_by_author.index = pd.MultiIndex.from_arrays(
+                [daily_by_author.index.get_level_values(0),
+                 pd.DatetimeIndex(daily_by_author.index.get_level_values(1))],
+                names=['author', 'date'])
+            self._daily = daily_by_author
+            self._source = None
+        return self._daily
+
+def calculate_commit_frequency(commits):
+    return commit_frequency_from_frame(build_frame(commits, COMMIT_FIELDS))
+
+def calculate_pr_merge_rate(pull_requests):
+    return pr_merge_rate_from_frame(build_frame(pull_requests, PULL_REQUEST_FIELDS))
+
+def calculate_issue_resolution_time(issues):
+    return mean_or_zero(closed_issue_days_from_frame(build_frame(issues_only(issues), ISSUE_FIELDS)))
+
+def calculate_contributor_activity(commits):
+    return contributor_activity_from_frame(build_frame(commits, COMMIT_FIELDS))
+
+def calculate_top_issues(issues):
+    return top_issues_from_frame(build_frame(issues_only(issues), ISSUE_FIELDS))
 
 def calculate_pr_review_time(pull_requests):
-    if not pull_requests:
-        return 0
-    
-    df_prs = pd.DataFrame([{
-        'title': pr.title,
-        'created_at': pr.created_at,
-        'merged_at': pr.merged_at
-    } for pr in pull_requests if pr.merged_at is not None and hasattr(pr, 'created_at')])
-    
-    if df_prs.empty:
-        return 0
-    
-    df_prs['created_at'] = pd.to_datetime(df_prs['created_at'])
-    df_prs['merged_at'] = pd.to_datetime(df_prs['merged_at'])
-    df_prs['review_time'] = (df_prs['merged_at'] - df_prs['created_at']).dt.days
-    
-    average_review_time = df_prs['review_time'].mean()
-    
-    return average_review_time
+    return mean_or_zero(pr_review_days_from_frame(build_frame(pull_requests, PULL_REQUEST_FIELDS)))
 
 def calculate_issue_age(issues):
-    if not issues:
-        return 0
-    
-    df_issues = pd.DataFrame([{
-        'title': issue.title,
-        'created_at': issue.created_at,
-        'closed_at': issue.closed_at
-    } for issue in issues if issue.closed_at is not None and hasattr(issue, 'created_at')])
-    
-    if df_issues.empty:
-        return 0
-    
-    df_issues['created_at'] = pd.to_datetime(df_issues['created_at'])
-    df_issues['closed_at'] = pd.to_datetime(df_issues['closed_at'])
-    df_issues['age'] = (df_issues['closed_at'] - df_issues['created_at']).dt.days
-    
-    average_issue_age = df_issues['age'].mean()
-    
-    return average_issue_age
+    return mean_or_zero(closed_issue_days_from_frame(build_frame(issues_only(issues), ISSUE_FIELDS)))
 
 def calculate_metrics(data):
-    commits = data.get('commits', [])
-    pull_requests = data.get('pull_requests', [])
-    issues = data.get('issues', [])
+    # Every entity is turned into a frame exactly once and all metrics are
+    # vectorized expressions over those frames
+    frames = build_frames(data)
+    closed_issue_days = closed_issue_days_from_frame(frames['issues'])
+    average_closed_issue_days = mean_or_zero(closed_issue_days)
 
     metrics = {
-        'commit_frequency': calculate_commit_frequency(commits),
-        'pr_merge_rate': calculate_pr_merge_rate(pull_requests),
-        'issue_resolution_time': calculate_issue_resolution_time(issues),
-        'contributor_activity': calculate_contributor_activity(commits),
-        'top_issues': calculate_top_issues(issues),
-        'pr_review_time': calculate_pr_review_time(pull_requests),
-        'issue_age': calculate_issue_age(issues)
+        'commit_frequency': commit_frequency_from_frame(frames['commits']),
+        'commit_cube': CommitCube.from_frame(frames['commits']),
+        'pr_merge_rate': pr_merge_rate_from_frame(frames['pull_requests']),
+        'issue_resolution_time': average_closed_issue_days,
+        'contributor_activity': contributor_activity_from_frame(frames['commits']),
+        'top_issues': top_issues_from_frame(frames['issues']),
+        'pr_review_time': mean_or_zero(pr_review_days_from_frame(frames['pull_requests'])),
+        # Issue age is measured from creation to closure, the same span as resolution time
+        'issue_age': average_closed_issue_days,
+        # Kept so queries can filter and aggregate without another fetch
+        'frames': frames
     }
 
     return metrics
+
+class MetricsState:
+    """Running aggregates behind calculate_metrics that can be updated from fetch deltas.
+
+    Keeps per-day and per-author commit counts, sums and counts of resolution and review times,
+    and a lazily cleaned max-heap of issues by comment count. Each entity's last contribution is
+    remembered by key, so an updated item is first retracted and then added again; applying a delta
+    costs time proportional to the number of changed items, not to the history.
+    """
+
+    def __init__(self):
+        self.commits = {}  # sha -> (day, author)
+        self.pull_requests = {}  # number -> (state, review days or None)
+        self.issues = {}  # number -> (title, comments, resolution days or None)
+        self.commit_days = Counter()
+        self.author_counts = Counter()
+        self.author_days = Counter()  # (author, day) -> commits
+        self.closed_prs = 0
+        self.review_days_sum = 0
+        self.review_days_count = 0
+        self.resolution_days_sum = 0
+        self.resolution_days_count = 0
+        self._comment_heap = []  # (-comments, number, title), entries may be stale
+        self._commit_metrics = None  # Commit series and cube of the last to_metrics, until a commit changes
+
+    def apply_delta(self, new_items, updated_items):
+        """Fold new and updated commit, pull request and issue records into the aggregates."""
+        for item in chain(new_items, updated_items):
+            if isinstance(item, CommitRecord):
+                self._set_commit(item.sha, (item.date.date().isoformat(), item.author) if item.date else None)
+            elif isinstance(item, PullRequestRecord):
+                review_days = None
+                if item.merged_at is not None and item.created_at is not None:
+                    review_days = (item.merged_at - item.created_at).days
+                self._set_pull_request(item.number, (item.state, review_days))
+            elif isinstance(item, IssueRecord) and not item.is_pull_request:
+                resolution_days = None
+                if item.closed_at is not None and item.created_at is not None:
+                    resolution_days = (item.closed_at - item.created_at).days
+                self._set_issue(item.number, (item.title, item.comments, resolution_days))
+        return self
+
+    def to_metrics(self):
+        """Return a metrics dict in the same shape as calculate_metrics, without the record frames.
+
+        The commit series are only rebuilt when a commit changed, and the per-author counts
+        behind the commit cube only once they are read.
+        """
+        if self._commit_metrics is None:
+            self._commit_metrics = self._build_commit_metrics()
+        commit_frequency, commit_cube, contributor_activity = self._commit_metrics
+
+        top_issues = pd.DataFrame(self.top_issues(), columns=['title', 'comments'])
+        if top_issues.empty:
+            top_issues = pd.DataFrame()
+
+        total_prs = len(self.pull_requests)
+        average_resolution_days = (self.resolution_days_sum / self.resolution_days_count
+                                   if self.resolution_days_count else 0)
+        return {
+            'commit_frequency': commit_frequency,
+            'commit_cube': commit_cube,
+            'pr_merge_rate': {
+                'total_prs': total_prs,
+                'merged_prs': self.closed_prs,
+                'merge_rate': self.closed_prs / total_prs if total_prs > 0 else 0
+            },
+            'issue_resolution_time': average_resolution_days,
+            'contributor_activity': contributor_activity,
+            'top_issues': top_issues,
+            'pr_review_time': self.review_days_sum / self.review_days_count if self.review_days_count else 0,
+            'issue_age': average_resolution_days
+        }
+
+    def top_issues(self, count=TOP_ISSUES_COUNT):
+        """Return [(title, comments)] for the most commented issues, dropping stale heap entries."""
+        if len(self._comment_heap) > 2 * len(self.issues) + count:
+            self._rebuild_comment_heap()
+        popped = []
+        top = []
+        seen = set()
+        while self._comment_heap and len(top) < count:
+            entry = heapq.heappop(self._comment_heap)
+            negative_comments, number, title = entry
+            current = self.issues.get(number)
+            if number in seen or current is None or current[0] != title or current[1] != -negative_comments:
+                continue
+            popped.append(entry)
+            seen.add(number)
+            top.append((title, -negative_comments))
+        for entry in popped:
+            heapq.heappush(self._comment_heap, entry)
+        return top
+
+    def _build_commit_metrics(self):
+        commit_frequency = pd.Series()
+        if self.commit_days:
+            days = sorted(self.commit_days)
+            commit_frequency = pd.Series(
+                [self.commit_days[day] for day in days],
+                index=pd.DatetimeIndex(pd.to_datetime(days, utc=True), name='date')
+            ).asfreq('D', fill_value=0)
+
+        # The cube gets a copy of the per-author counts, turned into a series only if they are read
+        daily_by_author = partial(_author_days_series, dict(self.author_days)) if self.author_days else None
+        authors = sorted({author for author, _ in self.author_days})
+        commit_cube = CommitCube.from_daily(commit_frequency, daily_by_author, authors)
+
+        contributor_activity = pd.Series()
+        if self.author_counts:
+            authors, counts = zip(*self.author_counts.most_common())
+            contributor_activity = pd.Series(counts, index=pd.Index(authors, name='author'), name='count')
+        return commit_frequency, commit_cube, contributor_activity
+
+    def _set_commit(self, sha, value):
+        self._commit_metrics = None
+        previous = self.commits.get(sha)
+        if previous:
+            day, author = previous
+            self.commit_days[day] -= 1
+            if not self.commit_days[day]:
+                del self.commit_days[day]
+            self.author_days[author or '', day] -= 1
+            if not self.author_days[author or '', day]:
+                del self.author_days[author or '', day]
+            if author is not None:
+                self.author_counts[author] -= 1
+                if not self.author_counts[author]:
+                    del self.author_counts[author]
+        self.commits[sha] = value
+        if value:
+            day, author = value
+            self.commit_days[day] += 1
+            self.author_days[author or '', day] += 1
+            if author is not None:
+                self.author_counts[author] += 1
+
+    def _set_pull_request(self, number, value):
+        previous = self.pull_requests.get(number)
+        if previous:
+            state, review_days = previous
+            self.closed_prs -= state == 'closed'
+            if review_days is not None:
+                self.review_days_sum -= review_days
+                self.review_days_count -= 1
+        self.pull_requests[number] = value
+        state, review_days = value
+        self.closed_prs += state == 'closed'
+        if review_days is not None:
+            self.review_days_sum += review_days
+            self.review_days_count += 1
+
+    def _set_issue(self, number, value):
+        previous = self.issues.get(number)
+        if previous and previous[2] is not None:
+            self.resolution_days_sum -= previous[2]
+            self.resolution_days_count -= 1
+        self.issues[number] = value
+        title, comments, resolution_days = value
+        if resolution_days is not None:
+            self.resolution_days_sum += resolution_days
+            self.resolution_days_count += 1
+        if previous is None or previous[:2] != value[:2]:
+            heapq.heappush(self._comment_heap, (-comments, number, title))
+
+    def _rebuild_comment_heap(self):
+        self._comment_heap = [(-comments, number, title) for number, (title, comments, _) in self.issues.items()]
+        heapq.heapify(self._comment_heap)
+
+def _author_days_series(author_days):
+    keys = sorted(author_days)
+    series = pd.Series([author_days[key] for key in keys],
+                       index=pd.MultiIndex.from_tuples(keys, names=['author', 'date']))
+    series.index = series.index.set_levels(pd.to_datetime(series.index.levels[1]), level='date')
+    return series
+
+def calculate_metrics_incrementally(data, state=None):
+    """Return (metrics, state), updating state in place from data['delta'] when both are available.
+
+    Without a previous state or a delta, or when the state holds a different number of items than
+    the dataset (it missed a delta), the state is rebuilt from the full dataset. Like calculate_metrics,
+    the metrics include the record frames that filtered queries are answered from; they are only
+    built when read.
+    """
+    delta = data.get('delta')
+    if state is not None and delta is not None:
+        state.apply_delta(chain.from_iterable(changes['new'] for changes in delta.values()),
+                          chain.from_iterable(changes['updated'] for changes in delta.values()))
+        if (len(state.commits) != len(data.get('commits') or [])
+                or len(state.pull_requests) != len(data.get('pull_requests') or [])
+                or len(state.issues) != len(issues_only(data.get('issues') or []))):
+            print("Metrics state is out of step with the dataset, rebuilding it")
+            state = None
+    if state is None or delta is None:
+        state = MetricsState()
+        state.apply_delta(chain(data.get('commits') or [], data.get('pull_requests') or [],
+                                data.get('issues') or []), [])
+    metrics = state.to_metrics()
+    # The aggregates cannot be narrowed down, so filtered queries need the frames as well
+    metrics['frames'] = RecordFrames(data)
+    return metrics, state
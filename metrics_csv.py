@@ -1,5 +1,10 @@
 import pandas as pd
+import json
 import os
+import tempfile
+from datetime import date, datetime, timezone
+
+from metrics_calculation import CommitCube
 
 def ensure_directory_exists(directory):
     """Ensure the directory exists, create it if not."""
@@ -15,7 +20,11 @@ def export_commit_frequency(commit_frequency, file_path='./'):
 
 def export_pr_merge_rate(pr_merge_rate, file_path='./'):
     ensure_directory_exists(file_path)
-    df_pr_merge_rate = pd.DataFrame([pr_merge_rate], columns=['Total PRs', 'Merged PRs', 'Merge Rate'])
+    df_pr_merge_rate = pd.DataFrame([{
+        'Total PRs': pr_merge_rate.get('total_prs'),
+        'Merged PRs': pr_merge_rate.get('merged_prs'),
+        'Merge Rate': pr_merge_rate.get('merge_rate'),
+    }])
     full_path = os.path.join(file_path, 'pr_merge_rate.csv')
     df_pr_merge_rate.to_csv(full_path, index=False)
     print(f"PR merge rate saved to '{full_path}'.")
@@ -67,3 +76,226 @@ def export_all_metrics(metrics, file_path='./'):
     export_issue_age(metrics['issue_age'], file_path)
     print(f"All metrics exported to CSV files at '{file_path}'.")
 
+COLUMNAR_EXPORT_PATH = 'metrics_export'
+COLUMNAR_FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+COLUMNAR_COMPRESSION = 'zstd'
+MANIFEST_NAME = 'manifest.json'
+
+def metrics_to_frames(metrics):
+    """Turn a metrics dict into one typed table per metric family, with stable column names."""
+    commit_frequency = metrics.get('commit_frequency', pd.Series())
+    frames = {
+        'commit_frequency': pd.DataFrame({
+            'date': pd.DatetimeIndex(commit_frequency.index),
+            'commits': commit_frequency.to_numpy(dtype='int64'),
+        }),
+    }
+    commit_cube = metrics.get('commit_cube')
+    if commit_cube is not None:
+        daily_by_author = commit_cube.by_author['day']
+        frames['commit_activity'] = pd.DataFrame({
+            'author': daily_by_author.index.get_level_values('author').astype(str),
+            'date': daily_by_author.index.get_level_values('date'),
+            'commits': daily_by_author.to_numpy(dtype='int64'),
+        })
+    contributor_activity = metrics.get('contributor_activity', pd.Series())
+    frames['contributor_activity'] = pd.DataFrame({
+        'author': contributor_activity.index.astype(str),
+        'commits': contributor_activity.to_numpy(dtype='int64'),
+    })
+    top_issues = metrics.get('top_issues', pd.DataFrame())
+    frames['top_issues'] = pd.DataFrame({
+        'title': top_issues['title'].astype(str) if 'title' in top_issues else pd.Series(dtype=str),
+        'comments': top_issues['comments'].astype('int64') if 'comments' in top_issues else pd.Series(dtype='int64'),
+    }).reset_index(drop=True)
+    frames['summary'] = summary_frame(metrics)
+    return frames
+
+def summary_frame(metrics):
+    """Return the scalar metrics as a one-row table."""
+    merge_rate = metrics.get('pr_merge_rate', {})
+    return pd.DataFrame([{
+        'total_prs': int(merge_rate.get('total_prs', 0)),
+        'merged_prs': int(merge_rate.get('merged_prs', 0)),
+        'merge_rate': float(merge_rate.get('merge_rate', 0)),
+        'issue_resolution_time': float(metrics.get('issue_resolution_time', 0)),
+        'pr_review_time': float(metrics.get('pr_review_time', 0)),
+        'issue_age': float(metrics.get('issue_age', 0)),
+    }])
+
+def partition_path(root, repo, snapshot_date):
+    """Return root/repo=<owner__name>/snapshot_date=<YYYY-MM-DD>."""
+    return os.path.join(root, f"repo={repo.replace('/', '__')}", f"snapshot_date={snapshot_date.isoformat()}")
+
+def _file_mode():
+    # The umask can only be read by setting it, so do that once at import time
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+FILE_MODE = _file_mode()  # Mode of exported files, as open() would have created them
+
+def write_atomically(directory, file_name, write):
+    """Call write(temp_path) and rename the result into place, so readers never see a partial file."""
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{file_name}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        write(temp_path)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temp_path, FILE_MODE)
+        os.replace(temp_path, os.path.join(directory, file_name))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def export_metrics_columnar(metrics, repo, root=COLUMNAR_EXPORT_PATH, snapshot_date=None, file_format='parquet'):
+    """Write every metric table as compressed Parquet or Feather into the repo's snapshot partition.
+
+    The manifest listing the tables, their row counts and schemas is written last, so a partition
+    with a manifest is always complete. Returns the partition directory.
+    """
+    if file_format not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown columnar format '{file_format}', expected one of {list(COLUMNAR_FORMATS)}")
+    snapshot_date = snapshot_date or date.today()
+    directory = partition_path(root, repo, snapshot_date)
+    ensure_directory_exists(directory)
+
+    tables = {}
+    for name, frame in metrics_to_frames(metrics).items():
+        file_name = name + COLUMNAR_FORMATS[file_format]
+        if file_format == 'parquet':
+            write_atomically(directory, file_name,
+                             lambda path: frame.to_parquet(path, index=False, compression=COLUMNAR_COMPRESSION))
+        else:
+            write_atomically(directory, file_name,
+                             lambda path: frame.to_feather(path, compression=COLUMNAR_COMPRESSION))
+        tables[name] = {
+            'file': file_name,
+            'rows': len(frame),
+            'columns': {column: str(dtype) for column, dtype in frame.dtypes.items()},
+        }
+
+    manifest = {
+        'repo': repo,
+        'snapshot_date': snapshot_date.isoformat(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'format': file_format,
+        'compression': COLUMNAR_COMPRESSION,
+        'tables': tables,
+    }
+
+    def write_manifest(path):
+        with open(path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    write_atomically(directory, MANIFEST_NAME, write_manifest)
+    print(f"All metrics exported as {file_format} to '{directory}'.")
+    return directory
+
+def _read_csv(directory, file_name, **kwargs):
+    full_path = os.path.join(directory, file_name)
+    if not os.path.exists(full_path):
+        print(f"No '{file_name}' in '{directory}', using an empty value.")
+        return None
+    return pd.read_csv(full_path, **kwargs)
+
+def _first_value(frame, default=0):
+    if frame is None or frame.empty or pd.isna(frame.iloc[0, 0]):
+        return default
+    return frame.iloc[0, 0]
+
+def _finish_metrics(commit_frequency, contributor_activity, top_issues, summary, commit_activity=None):
+    daily_by_author = None
+    if commit_activity is not None and not commit_activity.empty:
+        daily_by_author = commit_activity.set_index(['author', 'date'])['commits']
+    merge_rate = {
+        'total_prs': int(summary.get('total_prs') or 0),
+        'merged_prs': int(summary.get('merged_prs') or 0),
+        'merge_rate': float(summary.get('merge_rate') or 0),
+    }
+    if not merge_rate['merge_rate'] and merge_rate['total_prs']:
+        merge_rate['merge_rate'] = merge_rate['merged_prs'] / merge_rate['total_prs']
+    return {
+        'commit_frequency': commit_frequency,
+        'commit_cube': CommitCube.from_daily(commit_frequency, daily_by_author),
+        'pr_merge_rate': merge_rate,
+        'issue_resolution_time': summary.get('issue_resolution_time') or 0,
+        'contributor_activity': contributor_activity,
+        'top_issues': top_issues,
+        'pr_review_time': summary.get('pr_review_time') or 0,
+        'issue_age': summary.get('issue_age') or 0,
+    }
+
+def _commit_series(dates, counts):
+    if len(dates) == 0:
+        return pd.Series()
+    index = pd.DatetimeIndex(pd.to_datetime(dates, utc=True), name='date')
+    return pd.Series(pd.to_numeric(counts).astype('int64').to_numpy(), index=index, name='count')
+
+def _contributor_series(authors, counts):
+    if len(authors) == 0:
+        return pd.Series()
+    return pd.Series(pd.to_numeric(counts).astype('int64').to_numpy(), index=pd.Index(authors, name='author'),
+                     name='count')
+
+def load_metrics_csv(directory):
+    """Rebuild the metrics dict from the CSV files written by export_all_metrics."""
+    commit_frequency = _read_csv(directory, 'commit_frequency.csv')
+    if commit_frequency is not None and not commit_frequency.empty:
+        commit_frequency = _commit_series(commit_frequency.iloc[:, 0], commit_frequency.iloc[:, 1])
+    else:
+        commit_frequency = pd.Series()
+    contributor_activity = _read_csv(directory, 'contributor_activity.csv')
+    if contributor_activity is not None and not contributor_activity.empty:
+        contributor_activity = _contributor_series(contributor_activity.iloc[:, 0], contributor_activity.iloc[:, 1])
+    else:
+        contributor_activity = pd.Series()
+    top_issues = _read_csv(directory, 'top_issues.csv')
+    if top_issues is None or top_issues.empty:
+        top_issues = pd.DataFrame()
+
+    pr_merge_rate = _read_csv(directory, 'pr_merge_rate.csv')
+    summary = {}
+    if pr_merge_rate is not None and not pr_merge_rate.empty:
+        row = pr_merge_rate.iloc[0]
+        summary = {key: None if pd.isna(row.get(column)) else row.get(column)
+                   for key, column in (('total_prs', 'Total PRs'), ('merged_prs', 'Merged PRs'),
+                                       ('merge_rate', 'Merge Rate'))}
+    summary['issue_resolution_time'] = _first_value(_read_csv(directory, 'issue_resolution_time.csv'))
+    summary['pr_review_time'] = _first_value(_read_csv(directory, 'pr_review_time.csv'))
+    summary['issue_age'] = _first_value(_read_csv(directory, 'issue_age.csv'))
+    return _finish_metrics(commit_frequency, contributor_activity, top_issues, summary)
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+def latest_snapshot(directory):
+    """Return the newest snapshot_date=... partition below a repo=... directory, or the directory itself."""
+    snapshots = sorted(name for name in os.listdir(directory) if name.startswith('snapshot_date='))
+    return os.path.join(directory, snapshots[-1]) if snapshots else directory
+
+def load_metrics_columnar(directory):
+    """Rebuild the metrics dict from a snapshot partition written by export_metrics_columnar."""
+    manifest = read_manifest(directory)
+    tables = {}
+    for name, table in manifest['tables'].items():
+        full_path = os.path.join(directory, table['file'])
+        tables[name] = pd.read_parquet(full_path) if manifest['format'] == 'parquet' else pd.read_feather(full_path)
+    commit_frequency = tables['commit_frequency']
+    contributor_activity = tables['contributor_activity']
+    top_issues = tables['top_issues']
+    summary = tables['summary'].iloc[0].to_dict() if not tables['summary'].empty else {}
+    return _finish_metrics(_commit_series(commit_frequency['date'], commit_frequency['commits']),
+                           _contributor_series(contributor_activity['author'], contributor_activity['commits']),
+                           top_issues if not top_issues.empty else pd.DataFrame(),
+                           summary, tables.get('commit_activity'))
+
+def load_metrics(directory):
+    """Rebuild the metrics dict from an export directory: CSV files, a snapshot partition or a repo=... folder."""
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"Export directory '{directory}' does not exist")
+    directory = latest_snapshot(directory)
+    if os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        return load_metrics_columnar(directory)
+    return load_metrics_csv(directory)
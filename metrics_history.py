@@ -0,0 +1,127 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from metrics_csv import ensure_directory_exists, summary_frame, write_atomically
+
+DEFAULT_HISTORY_PATH = 'metrics_history'
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S%fZ'
+MAX_HISTORY_PARTS = 32  # Parts a repository's history may grow to before append_snapshot compacts them
+TREND_METRICS = ('merge_rate', 'issue_resolution_time', 'pr_review_time', 'issue_age', 'total_prs', 'merged_prs',
+                 'commits', 'contributors')
+
+# Snapshots are stored as Parquet parts under <root>/repo=<owner__name>/, one directory per repository.
+# Every part is named <first snapshot time>_<last snapshot time>_<id>.parquet, so the directory listing
+# is the (repo, time) index: a range query opens only the parts whose time span overlaps the range.
+
+def repo_directory(root, repo):
+    return os.path.join(root, f"repo={repo.replace('/', '__')}")
+
+def _part_name(first, last):
+    return f"{first.strftime(TIMESTAMP_FORMAT)}_{last.strftime(TIMESTAMP_FORMAT)}_{uuid.uuid4().hex[:8]}.parquet"
+
+def _part_span(file_name):
+    first, last, _ = file_name[:-len('.parquet')].split('_')
+    return (datetime.strptime(first, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc),
+            datetime.strptime(last, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc))
+
+def _parts(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.endswith('.parquet') and not name.startswith('.'))
+
+def _utc(value):
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
+
+def snapshot_row(metrics, repo, taken_at):
+    """Flatten the scalar metrics of one run into a single history row."""
+    row = summary_frame(metrics).iloc[0].to_dict()
+    commit_frequency = metrics.get('commit_frequency', pd.Series())
+    row['commits'] = int(commit_frequency.sum()) if not commit_frequency.empty else 0
+    row['contributors'] = len(metrics.get('contributor_activity', pd.Series()))
+    return {'repo': repo, 'taken_at': _utc(taken_at), **row}
+
+def append_snapshot(metrics, repo, root=DEFAULT_HISTORY_PATH, taken_at=None):
+    """Append one run's metrics to the repository's history and return the path of the part holding it.
+
+    Once the history has more than MAX_HISTORY_PARTS parts they are compacted into one, so range
+    queries keep opening a handful of files however often snapshots are taken.
+    """
+    taken_at = _utc(taken_at or datetime.now(timezone.utc))
+    directory = repo_directory(root, repo)
+    ensure_directory_exists(directory)
+    frame = pd.DataFrame([snapshot_row(metrics, repo, taken_at)])
+    file_name = _part_name(taken_at, taken_at)
+    write_atomically(directory, file_name, lambda path: frame.to_parquet(path, index=False))
+    if len(_parts(directory)) > MAX_HISTORY_PARTS:
+        return compact_history(repo, root)
+    return os.path.join(directory, file_name)
+
+def load_history(repo, start=None, end=None, root=DEFAULT_HISTORY_PATH, columns=None):
+    """Return the snapshots of a repository taken between start and end (inclusive), oldest first."""
+    directory = repo_directory(root, repo)
+    start = _utc(start)
+    end = _utc(end)
+    read_columns = None if columns is None else ['taken_at', *columns]
+    while True:
+        frames = []
+        try:
+            for file_name in _parts(directory):
+                first, last = _part_span(file_name)
+                if (start is not None and last < start) or (end is not None and first > end):
+                    continue
+                frames.append(pd.read_parquet(os.path.join(directory, file_name), columns=read_columns))
+            break
+        except FileNotFoundError:
+            # A compaction replaced the parts while they were read; list them again
+            continue
+    if not frames:
+        return pd.DataFrame(columns=['taken_at', *(columns or TREND_METRICS)]).set_index('taken_at')
+    # Right after a compaction, or when two processes compact at once, a snapshot can be in two parts
+    history = pd.concat(frames, ignore_index=True).drop_duplicates('taken_at')
+    history = history.sort_values('taken_at').set_index('taken_at')
+    return history.loc[start:end]
+
+def metric_trend(repo, metric, weeks=12, freq='W', root=DEFAULT_HISTORY_PATH, now=None):
+    """Return a metric's average per period over the last `weeks` weeks, e.g. weekly PR review time."""
+    if metric not in TREND_METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {list(TREND_METRICS)}")
+    now = now or datetime.now(timezone.utc)
+    history = load_history(repo, start=now - timedelta(weeks=weeks), end=now, root=root, columns=[metric])
+    if history.empty:
+        return pd.Series(dtype=float, name=metric)
+    return history[metric].resample(freq).mean().dropna()
+
+def compact_history(repo, root=DEFAULT_HISTORY_PATH):
+    """Merge a repository's parts into one, keeping the span of its snapshots in the file name.
+
+    Called by append_snapshot once there are more than MAX_HISTORY_PARTS parts. Another process
+    compacting at the same time may have removed some of the parts already; those are skipped.
+    """
+    directory = repo_directory(root, repo)
+    parts = _parts(directory)
+    if len(parts) < 2:
+        return None
+    frames = []
+    for name in parts:
+        try:
+            frames.append(pd.read_parquet(os.path.join(directory, name)))
+        except FileNotFoundError:
+            continue
+    if not frames:
+        return None
+    history = pd.concat(frames, ignore_index=True).drop_duplicates('taken_at')
+    history = history.sort_values('taken_at').reset_index(drop=True)
+    file_name = _part_name(history['taken_at'].iloc[0], history['taken_at'].iloc[-1])
+    write_atomically(directory, file_name, lambda path: history.to_parquet(path, index=False))
+    for name in parts:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return os.path.join(directory, file_name)
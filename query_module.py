@@ -1,93 +1,398 @@
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
 import pandas as pd
-from charts import (
-    plot_language_distribution,
-    plot_commit_frequency,
-    plot_pull_request_merge_rate,
-    plot_average_issue_resolution_time,
-    plot_contributor_activity,
-    plot_top_issues_by_comments,
-    plot_average_pull_request_review_time,
-    plot_average_issue_age
+
+from metrics_calculation import (
+    closed_issue_days_from_frame,
+    mean_or_zero,
+    pr_merge_rate_from_frame,
+    pr_review_days_from_frame,
+    top_issues_from_frame
 )
 
-def handle_user_query(query: str, metrics: dict):
+# A parsed query: what to show and how to narrow it down. Every field but intent may be None.
+QuerySpec = namedtuple('QuerySpec', ['intent', 'author', 'start', 'end', 'granularity', 'state', 'label'])
+
+# Phrases naming each metric, compiled into a single alternation so one regex scan finds the intent.
+# The first phrase in the query wins; at the same position the earlier intent does.
+INTENT_PHRASES = {
+    'languages': [r'language distribution', r'languages?'],
+    'top_issues': [r'top issues(?: by comments)?', r'most commented issues?', r'issues'],
+    'pr_merge_rate': [r'(?:pr|pull request) merge rate', r'merge rate'],
+    'pr_review_time': [r'(?:pr|pull request) review time', r'review time'],
+    'issue_resolution_time': [r'issue resolution time', r'resolution time'],
+    'issue_age': [r'issue age'],
+    'contributor_activity': [r'contributor activity', r'contributors?', r'top authors'],
+    'commit_frequency': [r'commit frequency', r'commit activity', r'commits?'],
+}
+INTENT_PATTERN = re.compile('|'.join(
+    f"(?P<{intent}>\\b(?:{'|'.join(phrases)})\\b)" for intent, phrases in INTENT_PHRASES.items()))
+
+UNITS = {'day': 1, 'week': 7, 'month': 30, 'quarter': 91, 'year': 365}
+GRANULARITY_WORDS = {'daily': 'day', 'weekly': 'week', 'monthly': 'month', 'quarterly': 'quarter'}
+# Words that can follow "for"/"of" without naming an author, e.g. "number of commits for the last week"
+STOP_WORDS = (r'(?:the|last|past|this|all|each|every|per|since|between|from|days?|weeks?|months?|quarters?|years?'
+              r'|commits?|issues?|prs?|pull|contributors?|languages?|merge|review|open|closed|merged)\b')
+DATE = r'\d{4}-\d{2}-\d{2}'
+
+AUTHOR_PATTERN = re.compile(rf"\b(?:for|by author|author|from user|of)\s+@?(?!{STOP_WORDS})(?P<author>[\w][\w.-]*)")
+WINDOW_PATTERN = re.compile(r"\b(?:last|past)\s+(?P<count>\d+)?\s*(?P<unit>day|week|month|quarter|year)s?\b")
+RANGE_PATTERN = re.compile(rf"\b(?:between|from)\s+(?P<start>{DATE})\s+(?:and|to)\s+(?P<end>{DATE})")
+SINCE_PATTERN = re.compile(rf"\bsince\s+(?P<start>{DATE})")
+GRANULARITY_PATTERN = re.compile(r"\b(?:by|per|each|every)\s+(?P<granularity>day|week|month|quarter)\b"
+                                 r"|\b(?P<adverb>daily|weekly|monthly|quarterly)\b")
+STATE_PATTERN = re.compile(r"\b(?P<state>open|closed|merged)\b")
+LABEL_PATTERN = re.compile(r"\b(?:label(?:l?ed)?|tagged)\s+['\"]?(?P<label>[\w:./-]+)")
+
+QUERY_CACHE_SIZE = 128  # Answered queries kept across reruns and sessions
+QUERY_CACHE_BYTES = 32 * 1024 * 1024  # Upper bound on the serialized figures they hold
+
+# The filters each intent can apply, and the metric it needs to apply them
+FILTERS = {
+    'languages': (None, ()),
+    'commit_frequency': ('commit_cube', ('author', 'window', 'granularity')),
+    'contributor_activity': ('commit_cube', ('window',)),
+    'pr_merge_rate': ('frames', ('author', 'state', 'window')),
+    'pr_review_time': ('frames', ('author', 'state', 'window')),
+    'issue_resolution_time': ('frames', ('author', 'state', 'label', 'window')),
+    'issue_age': ('frames', ('author', 'state', 'label', 'window')),
+    'top_issues': ('frames', ('author', 'state', 'label', 'window')),
+}
+
+TITLES = {
+    'languages': "Language Distribution",
+    'commit_frequency': "Commit Frequency",
+    'pr_merge_rate': "Pull Request Merge Rate",
+    'issue_resolution_time': "Average Issue Resolution Time",
+    'contributor_activity': "Contributor Activity",
+    'top_issues': "Top Issues by Comments",
+    'pr_review_time': "Average Pull Request Review Time",
+    'issue_age': "Average Issue Age",
+}
+
+def parse_query(query: str, now=None) -> QuerySpec:
     """
-    Process the natural language query to determine which chart to display.
-    
+    Parse a natural language query into a QuerySpec.
+
     Args:
-    - query (str): The user's query.
-    - metrics (dict): The dictionary of calculated metrics.
-    
+    - query (str): The user's query, e.g. "commit frequency for alice last 90 days by week".
+    - now (datetime): End of relative windows such as "last 90 days"; defaults to the current UTC time.
+
     Returns:
-    - tuple: (Figure, string) where Figure is the Plotly chart and string is the description.
+    - QuerySpec: intent is None when no metric is named.
+    """
+    text = query.lower()
+    now = now or datetime.now(timezone.utc)
+
+    match = INTENT_PATTERN.search(text)
+    intent = match.lastgroup if match else None
+
+    start = end = None
+    window = WINDOW_PATTERN.search(text)
+    date_range = RANGE_PATTERN.search(text)
+    since = SINCE_PATTERN.search(text)
+    if date_range:
+        start = pd.Timestamp(date_range.group('start'), tz='UTC')
+        end = pd.Timestamp(date_range.group('end'), tz='UTC') + timedelta(days=1) - timedelta(microseconds=1)
+    elif since:
+        start = pd.Timestamp(since.group('start'), tz='UTC')
+    elif window:
+        days = int(window.group('count') or 1) * UNITS[window.group('unit')]
+        start = pd.Timestamp(now - timedelta(days=days)).normalize()
+
+    granularity = GRANULARITY_PATTERN.search(text)
+    if granularity:
+        granularity = granularity.group('granularity') or GRANULARITY_WORDS[granularity.group('adverb')]
+
+    # Authors keep their original case, so they are read from the query rather than the lowered text
+    author = AUTHOR_PATTERN.search(text)
+    author = query[author.start('author'):author.end('author')] if author else None
+    state = STATE_PATTERN.search(text)
+    state = state.group('state') if state else None
+    label = LABEL_PATTERN.search(text)
+    label = query[label.start('label'):label.end('label')] if label else None
+    return QuerySpec(intent, author, start, end, granularity, state, label)
+
+def _match_author(author, candidates):
+    # Exact match first, then case-insensitive, then the first name containing the query
+    if author is None:
+        return None
+    candidates = [candidate for candidate in candidates if isinstance(candidate, str)]
+    lowered = author.lower()
+    for test in (lambda c: c == author, lambda c: c.lower() == lowered, lambda c: lowered in c.lower()):
+        for candidate in candidates:
+            if test(candidate):
+                return candidate
+    return author
+
+def _window_mask(dates, spec):
+    mask = pd.Series(True, index=dates.index)
+    if spec.start is not None:
+        mask &= dates >= spec.start
+    if spec.end is not None:
+        mask &= dates <= spec.end
+    return mask
+
+def _filter_frame(frame, spec, date_column):
+    mask = _window_mask(frame[date_column], spec)
+    if spec.author is not None:
+        mask &= frame['author'] == _match_author(spec.author, frame['author'].dropna().unique())
+    if spec.state == 'merged' and 'merged_at' in frame:
+        mask &= frame['merged_at'].notna()
+    elif spec.state is not None:
+        mask &= frame['state'] == spec.state
+    if spec.label is not None and 'labels' in frame:
+        # Labels are tuples; a repository has few distinct label sets, so each set is tested once and
+        # the result is spread back over the rows through the factorized codes
+        codes, label_sets = pd.factorize(frame['labels'])
+        wanted = spec.label.lower()
+        matches = np.array([any(str(label).lower() == wanted for label in labels) for labels in label_sets]
+                           + [False], dtype=bool)
+        mask &= matches[codes]
+    return frame[mask]
+
+def _describe(spec, applied):
+    parts = [TITLES[spec.intent]]
+    if 'author' in applied and spec.author:
+        parts.append(f"for {spec.author}")
+    if 'state' in applied and spec.state:
+        parts.append(f"({spec.state})")
+    if 'label' in applied and spec.label:
+        parts.append(f"labelled {spec.label}")
+    if 'window' in applied and (spec.start is not None or spec.end is not None):
+        start = spec.start.date().isoformat() if spec.start is not None else "start"
+        end = spec.end.date().isoformat() if spec.end is not None else "now"
+        parts.append(f"from {start} to {end}")
+    if 'granularity' in applied and spec.granularity:
+        parts.append(f"by {spec.granularity}")
+    return ' '.join(parts)
+
+def _unavailable_filters(spec, metrics):
+    """Return (unsupported, missing): the filters the query asks for that its metric cannot apply at all,
+    and those these metrics have no data for, e.g. metrics loaded from an export, which keep no records
+    to filter and no per-author commits when exported as CSV."""
+    source, supported = FILTERS[spec.intent]
+    available = set(supported)
+    if source is not None and metrics.get(source) is None:
+        available = set()
+    if 'author' in available and source == 'commit_cube' and not metrics[source].authors:
+        available.discard('author')
+    requested = {name: getattr(spec, name) is not None for name in ('author', 'state', 'label', 'granularity')}
+    requested['window'] = spec.start is not None or spec.end is not None
+    names = [name for name in ('author', 'state', 'label', 'window', 'granularity') if requested[name]]
+    unsupported = [name for name in names if name not in supported]
+    missing = [name for name in names if name in supported and name not in available]
+    return unsupported, missing
+
+def _filter_names(names):
+    return ', '.join('date range' if name == 'window' else name for name in names)
+
+def _naive(timestamp):
+    return timestamp.tz_convert('UTC').tz_localize(None) if timestamp is not None else None
+
+def run_query(spec: QuerySpec, metrics: dict):
+    """
+    Answer a parsed query from the metrics, filtering the cached frames when the query narrows it down.
+
+    Returns:
+    - tuple: (Figure or None, description).
     """
-    query = query.lower()
+    # Charts (and with them plotly) are only loaded once a query is answered
+    from charts import (
+        plot_language_distribution,
+        plot_commit_frequency,
+        plot_pull_request_merge_rate,
+        plot_average_issue_resolution_time,
+        plot_contributor_activity,
+        plot_top_issues_by_comments,
+        plot_average_pull_request_review_time,
+        plot_average_issue_age
+    )
 
-    if 'language distribution' in query:
+    if spec.intent is None:
+        return None, "Query not recognized. Please ask about available metrics."
+    # Answering with the unfiltered numbers would misstate what they cover
+    unsupported, missing = _unavailable_filters(spec, metrics)
+    if unsupported:
+        return None, (f"{TITLES[spec.intent]} cannot be filtered by {_filter_names(unsupported)}. "
+                      f"Ask without the filter.")
+    if missing:
+        return None, (f"{TITLES[spec.intent]} cannot be filtered by {_filter_names(missing)} for this data. "
+                      f"Ask without the filter, or fetch the repository to filter it.")
+    frames = metrics.get('frames')
+    filtered = any(value is not None for value in spec[1:])
+    applied = set()
+
+    if spec.intent == 'languages':
         df = pd.DataFrame(metrics.get('languages', {}).items(), columns=['Language', 'Bytes'])
-        if not df.empty:
-            fig = plot_language_distribution(df)
-            description = "Language Distribution"
-        else:
-            fig, description = None, "No language data available."
+        if df.empty:
+            return None, "No language data available."
+        return plot_language_distribution(df), _describe(spec, applied)
 
-    elif 'commit frequency' in query:
-        df = metrics.get('commit_frequency', pd.DataFrame())
-        if not df.empty:
-            fig = plot_commit_frequency(df)
-            description = "Commit Frequency Over Time"
+    if spec.intent == 'commit_frequency':
+        cube = metrics.get('commit_cube')
+        if cube is None:
+            df = metrics.get('commit_frequency', pd.Series())
         else:
-            fig, description = None, "No commit frequency data available."
+            author = _match_author(spec.author, cube.authors)
+            df = cube.series(spec.granularity or 'day', _naive(spec.start), _naive(spec.end), author)
+            applied |= {'author', 'window', 'granularity'}
+        if df.empty:
+            return None, "No commit frequency data available for this query."
+        return plot_commit_frequency(df, max_points=800), _describe(spec, applied)
 
-    elif 'pr merge rate' in query:
-        merge_rate = metrics.get('pr_merge_rate', {})
-        if merge_rate:
-            fig = plot_pull_request_merge_rate(merge_rate)
-            description = "Pull Request Merge Rate"
+    if spec.intent == 'contributor_activity':
+        cube = metrics.get('commit_cube')
+        if cube is not None and (spec.start is not None or spec.end is not None):
+            daily = cube.by_author['day']
+            dates = daily.index.get_level_values('date')
+            in_window = pd.Series(True, index=daily.index)
+            if spec.start is not None:
+                in_window &= dates >= _naive(spec.start)
+            if spec.end is not None:
+                in_window &= dates <= _naive(spec.end)
+            df = daily[in_window.to_numpy()].groupby(level='author').sum().sort_values(ascending=False)
+            applied.add('window')
         else:
-            fig, description = None, "No pull request merge rate data available."
+            df = metrics.get('contributor_activity', pd.Series())
+        if df.empty:
+            return None, "No contributor activity data available for this query."
+        return plot_contributor_activity(df), _describe(spec, applied)
 
-    elif 'issue resolution time' in query:
-        avg_resolution_time = metrics.get('issue_resolution_time', 0)
-        if avg_resolution_time:
-            fig = plot_average_issue_resolution_time(avg_resolution_time)
-            description = "Average Issue Resolution Time"
+    if spec.intent in ('pr_merge_rate', 'pr_review_time'):
+        if frames is not None and filtered:
+            prs = _filter_frame(frames['pull_requests'], spec, 'created_at')
+            applied |= {'author', 'state', 'window'}
+            if spec.intent == 'pr_merge_rate':
+                value = pr_merge_rate_from_frame(prs) if len(prs) else {}
+            else:
+                value = mean_or_zero(pr_review_days_from_frame(prs))
         else:
-            fig, description = None, "No issue resolution time data available."
+            value = metrics.get(spec.intent, {} if spec.intent == 'pr_merge_rate' else 0)
+        if not value:
+            return None, "No pull request data available for this query."
+        if spec.intent == 'pr_merge_rate':
+            return plot_pull_request_merge_rate(value), _describe(spec, applied)
+        return plot_average_pull_request_review_time(value), _describe(spec, applied)
 
-    elif 'contributor activity' in query:
-        df = metrics.get('contributor_activity', pd.DataFrame())
-        if not df.empty:
-            fig = plot_contributor_activity(df)
-            description = "Contributor Activity"
+    # Issue metrics: resolution time, age and the most commented issues
+    if frames is not None and filtered:
+        issues = _filter_frame(frames['issues'], spec, 'created_at')
+        applied |= {'author', 'state', 'label', 'window'}
+        if spec.intent == 'top_issues':
+            value = top_issues_from_frame(issues)
         else:
-            fig, description = None, "No contributor activity data available."
+            value = mean_or_zero(closed_issue_days_from_frame(issues))
+    else:
+        value = metrics.get(spec.intent, pd.DataFrame() if spec.intent == 'top_issues' else 0)
+    if spec.intent == 'top_issues':
+        if value.empty:
+            return None, "No top issues data available for this query."
+        return plot_top_issues_by_comments(value), _describe(spec, applied)
+    if not value:
+        return None, "No issue data available for this query."
+    if spec.intent == 'issue_resolution_time':
+        return plot_average_issue_resolution_time(value), _describe(spec, applied)
+    return plot_average_issue_age(value), _describe(spec, applied)
 
-    elif 'top issues by comments' in query:
-        df = metrics.get('top_issues', pd.DataFrame())
-        if not df.empty:
-            fig = plot_top_issues_by_comments(df)
-            description = "Top Issues by Comments"
-        else:
-            fig, description = None, "No top issues data available."
+def handle_user_query(query: str, metrics: dict):
+    """
+    Process the natural language query to determine which chart to display.
 
-    elif 'pr review time' in query:
-        avg_review_time = metrics.get('pr_review_time', 0)
-        if avg_review_time:
-            fig = plot_average_pull_request_review_time(avg_review_time)
-            description = "Average Pull Request Review Time"
-        else:
-            fig, description = None, "No pull request review time data available."
+    Args:
+    - query (str): The user's query.
+    - metrics (dict): The dictionary of calculated metrics.
 
-    elif 'issue age' in query:
-        avg_issue_age = metrics.get('issue_age', 0)
-        if avg_issue_age:
-            fig = plot_average_issue_age(avg_issue_age)
-            description = "Average Issue Age"
-        else:
-            fig, description = None, "No issue age data available."
+    Returns:
+    - tuple: (Figure, string) where Figure is the Plotly chart and string is the description.
+    """
+    return run_query(parse_query(query), metrics)
 
-    else:
-        fig, description = None, "Query not recognized. Please ask about available metrics."
+def _result_size(result):
+    spec_json, description = result
+    return len(spec_json or '') + len(description)
 
-    return fig, description
+class QueryResultCache:
+    """LRU of answered queries, bounded by entry count and by the size of the stored figures.
+
+    Results are keyed by a version stamp of the metrics they were computed from and the parsed query,
+    so differently worded queries asking the same thing share an entry, and metrics fetched again under
+    a new version never see answers from the old ones. Figures are stored as JSON and every hit returns
+    a fresh figure, so callers can change it freely.
+    """
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, max_bytes=QUERY_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._results = OrderedDict()  # (version, QuerySpec) -> (figure JSON or None, description)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, version, spec):
+        with self._lock:
+            result = self._results.get((version, spec))
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end((version, spec))
+            self.hits += 1
+        spec_json, description = result
+        if spec_json is None:
+            return None, description
+        import plotly.io as pio
+        return pio.from_json(spec_json), description
+
+    def put(self, version, spec, fig, description):
+        spec_json = None
+        if fig is not None:
+            import plotly.io as pio
+            figure_spec = fig.to_plotly_json()
+            figure_spec['layout'].pop('template', None)  # The dashboard template is the default on load
+            spec_json = pio.to_json(figure_spec, validate=False)
+        size = _result_size((spec_json, description))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._results.pop((version, spec), None)
+            if previous is not None:
+                self._bytes -= _result_size(previous)
+            self._results[(version, spec)] = (spec_json, description)
+            self._bytes += size
+            while len(self._results) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= _result_size(self._results.popitem(last=False)[1])
+
+    def invalidate(self, version=None):
+        """Drop the results computed from one version of the metrics, or all of them."""
+        with self._lock:
+            for key in [key for key in self._results if version is None or key[0] == version]:
+                self._bytes -= _result_size(self._results.pop(key))
+
+def cached_user_query(query: str, metrics: dict, version, cache: QueryResultCache):
+    """
+    Answer a query like handle_user_query, reusing the cached result of an equivalent earlier query.
+
+    Args:
+    - query (str): The user's query.
+    - metrics (dict): The dictionary of calculated metrics.
+    - version: Stamp that changes whenever the metrics are fetched or loaded again.
+    - cache (QueryResultCache): Where results are kept.
+
+    Returns:
+    - tuple: (Figure, string) as returned by handle_user_query.
+    """
+    spec = parse_query(query)
+    if spec.intent is None:
+        return run_query(spec, metrics)
+    result = cache.get(version, spec)
+    if result is None:
+        result = run_query(spec, metrics)
+        cache.put(version, spec, *result)
+    return result
@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+
+from github import Consts, Github
+from github.Auth import Auth, Token
+from github.Requester import WithRequester
+
+DEFAULT_BURST = 10  # Requests a token may always make back to back
+BURST_SHARE = 0.5  # Share of a token's remaining quota that may be spent without pacing
+REFRESH_INTERVAL = 100  # Requests per token between re-reading its real quota
+UNKNOWN_RESET_WAIT = 60  # Seconds to rest an exhausted token when no reset time is known
+REFRESH_POLL = 1.0  # Seconds between re-reads of a quota whose window should have rolled over
+
+# Per-thread record of the token used by the last pooled request, so a rate-limit
+# error can be charged to the token that caused it
+_last_request = threading.local()
+
+def tokens_from_config(*extra_tokens):
+    """Collect tokens from the arguments and the GITHUB_TOKENS / GITHUB_TOKEN environment variables."""
+    tokens = []
+    candidates = list(extra_tokens)
+    candidates += os.environ.get('GITHUB_TOKENS', '').replace('\n', ',').split(',')
+    candidates.append(os.environ.get('GITHUB_TOKEN', ''))
+    for token in candidates:
+        token = (token or '').strip()
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+class _TokenState:
+    __slots__ = ('token', 'remaining', 'limit', 'reset_at', 'read_at', 'level', 'refilled_at', 'since_refresh',
+                 'stale', 'refreshing')
+
+    def __init__(self, token, burst):
+        self.token = token
+        self.remaining = None  # Unknown until the first refresh
+        self.limit = None
+        self.reset_at = 0.0
+        self.read_at = 0.0  # When the quota was last read from GitHub
+        self.level = float(burst)
+        self.refilled_at = time.time()
+        self.since_refresh = 0
+        self.stale = False  # The window has rolled over and the quota must be re-read before use
+        self.refreshing = False
+
+class RateLimitScheduler:
+    """Paces GitHub requests over a pool of tokens using a token bucket per token.
+
+    Each token's bucket holds up to half of its remaining quota and refills at
+    remaining / seconds-until-reset, so short fetches run at full speed while large crawls are
+    spread over the rate-limit window instead of running the quota dry. Requests go to the
+    token with the most budget; when every token is spent the caller sleeps exactly until the
+    earliest reset. Quotas follow the X-RateLimit-Remaining and X-RateLimit-Reset headers of every
+    response made through PooledTokenAuth, and are re-read from the free /rate_limit endpoint every
+    REFRESH_INTERVAL requests and whenever a window rolls over.
+    """
+
+    def __init__(self, tokens, base_url=Consts.DEFAULT_BASE_URL, burst=DEFAULT_BURST):
+        if not tokens:
+            raise ValueError("At least one GitHub token is needed")
+        self.base_url = base_url
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._states = [_TokenState(token, burst) for token in dict.fromkeys(tokens)]
+        for state in self._states:
+            self.refresh(state.token)
+
+    @property
+    def tokens(self):
+        return [state.token for state in self._states]
+
+    def refresh(self, token):
+        """Re-read a token's quota from GitHub; /rate_limit does not count against it."""
+        try:
+            client = Github(auth=Token(token), base_url=self.base_url)
+            headers, _ = client.requester.requestJsonAndCheck('GET', '/rate_limit')
+            self.observe(token, headers)
+        except Exception as e:
+            print(f"Could not read rate limit for token ...{token[-4:]}: {e}")
+        finally:
+            with self._lock:
+                state = self._state_of(token)
+                state.read_at = max(state.read_at, time.time())
+                state.since_refresh = 0
+                state.stale = state.refreshing = False
+
+    def observe(self, token, headers):
+        """Update a token's quota from the X-RateLimit-* headers of a response to a request made with it."""
+        headers = {key.lower(): value for key, value in headers.items()}
+        if 'x-ratelimit-remaining' not in headers:
+            return
+        remaining = int(float(headers['x-ratelimit-remaining']))
+        with self._lock:
+            state = self._state_of(token)
+            reset_at = float(headers.get('x-ratelimit-reset', state.reset_at))
+            if 'x-ratelimit-limit' in headers:
+                state.limit = int(float(headers['x-ratelimit-limit']))
+            if state.remaining is None or reset_at > state.reset_at:
+                # First reading of this window's quota, so its burst can be released
+                state.remaining = remaining
+                state.level = float(min(self._capacity(state), remaining))
+            else:
+                # Responses to concurrent requests arrive out of order; the lowest count is the latest
+                state.remaining = min(state.remaining, remaining)
+                state.level = min(state.level, float(state.remaining))
+            state.reset_at = max(state.reset_at, reset_at)
+            state.read_at = time.time()
+
+    def mark_exhausted(self, token, reset_at=None):
+        """Take a token out of rotation until reset_at (epoch seconds)."""
+        with self._lock:
+            state = self._state_of(token)
+            state.remaining = 0
+            state.level = 0.0
+            state.reset_at = reset_at if reset_at is not None else time.time() + UNKNOWN_RESET_WAIT
+
+    def acquire(self):
+        """Block until a token may make one request, and return that token.
+
+        A token whose window has rolled over gets its new quota re-read before any of it is spent.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                for state in self._states:
+                    self._refill(state, now)
+                stale = [state.token for state in self._states if state.stale and not state.refreshing]
+                for state in self._states:
+                    state.refreshing = state.refreshing or state.stale
+                ready = [state for state in self._states if state.level >= 1]
+                if stale:
+                    wait = None
+                elif ready:
+                    state = max(ready, key=lambda s: (s.level, s.remaining if s.remaining is not None else 0))
+                    state.level -= 1
+                    state.since_refresh += 1
+                    if state.remaining is not None:
+                        state.remaining -= 1
+                    needs_refresh = state.since_refresh > REFRESH_INTERVAL
+                    token = state.token
+                    wait = None
+                else:
+                    wait = min(self._seconds_until_ready(state, now) for state in self._states)
+            if stale:
+                for token in stale:
+                    self.refresh(token)
+                continue
+            if wait is None:
+                if needs_refresh:
+                    self.refresh(token)
+                return token
+            time.sleep(wait)
+
+    def status(self):
+        """Return (token suffix, remaining, limit, reset_at) for every token in the pool."""
+        with self._lock:
+            return [(state.token[-4:], state.remaining, state.limit, state.reset_at) for state in self._states]
+
+    def _state_of(self, token):
+        for state in self._states:
+            if state.token == token:
+                return state
+        raise KeyError("Token is not part of this pool")
+
+    def _capacity(self, state):
+        return max(self.burst, int(state.remaining * BURST_SHARE))
+
+    def _refill(self, state, now):
+        if state.remaining is not None and state.reset_at <= now and now - state.read_at >= REFRESH_POLL:
+            # The window has rolled over; hold the token back until its new quota has been read
+            state.stale = True
+        if state.stale:
+            state.level = 0.0
+        elif state.remaining is None:
+            # Quota unknown (or not enforced, as on some Enterprise servers), do not pace
+            state.level = float(self.burst)
+        elif state.remaining <= 0:
+            state.level = 0.0
+        else:
+            rate = state.remaining / max(state.reset_at - now, 1.0)
+            state.level = min(self._capacity(state), state.remaining,
+                              state.level + (now - state.refilled_at) * rate)
+        state.refilled_at = now
+
+    def _seconds_until_ready(self, state, now):
+        if state.stale:
+            # Being re-read by another thread
+            return REFRESH_POLL
+        if state.remaining <= 0:
+            # Past the reset the quota is re-read, at most every REFRESH_POLL seconds
+            return max(state.reset_at - now, state.read_at + REFRESH_POLL - now, 0.0)
+        rate = state.remaining / max(state.reset_at - now, 1.0)
+        return max((1.0 - state.level) / rate, 0.0)
+
+class PooledTokenAuth(Auth, WithRequester):
+    """PyGithub authentication that asks a RateLimitScheduler for a token before every request.
+
+    The X-RateLimit-* headers of every response are handed back to the scheduler, charged to the
+    token named in the request's Authorization header.
+    """
+
+    def __init__(self, scheduler):
+        WithRequester.__init__(self)
+        self.scheduler = scheduler
+
+    def withRequester(self, requester):
+        super().withRequester(requester)
+        # PyGithub has no response hook, so add one to the requests session of every
+        # connection the requester opens
+        connection_class = getattr(requester, '_Requester__connectionClass', None)
+        if connection_class is None:
+            print("Response headers are not available; rate limits are only read from /rate_limit")
+            return self
+
+        def connect(*args, **kwargs):
+            connection = connection_class(*args, **kwargs)
+            connection.session.hooks['response'].append(self._observe_response)
+            return connection
+
+        requester._Requester__connectionClass = connect
+        return self
+
+    def _observe_response(self, response, *args, **kwargs):
+        _, _, token = response.request.headers.get('Authorization', '').partition(' ')
+        if token in self.scheduler.tokens:
+            self.scheduler.observe(token, response.headers)
+
+    @property
+    def token_type(self):
+        return 'token'
+
+    @property
+    def token(self):
+        return getattr(_last_request, 'token', None) or self.scheduler.tokens[0]
+
+    def authentication(self, headers):
+        token = self.scheduler.acquire()
+        _last_request.token = token
+        _last_request.scheduler = self.scheduler
+        headers['Authorization'] = f"{self.token_type} {token}"
+
+    @property
+    def _masked_token(self):
+        return "token (pooled token removed)"
+
+def last_pooled_request():
+    """Return (scheduler, token) used by the calling thread's last pooled request, or None."""
+    scheduler = getattr(_last_request, 'scheduler', None)
+    if scheduler is None:
+        return None
+    return scheduler, _last_request.token
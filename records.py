@@ -0,0 +1,95 @@
+from datetime import datetime
+
+def parse_github_timestamp(value):
+    """Parse an ISO 8601 timestamp from the GitHub API into an aware datetime (None stays None)."""
+    if value is None:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _login_of(user):
+    return user.get('login') if user else None
+
+class Record:
+    """Compact, slotted holder for the fields of a GitHub entity that the dashboard uses.
+
+    Records are built from the JSON payload of a listing, so reading them never triggers a request.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values, **fields):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values):]:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, fields):
+        return cls(**fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+class CommitRecord(Record):
+    __slots__ = ('sha', 'author', 'date')
+
+    @classmethod
+    def from_raw(cls, raw):
+        author = (raw.get('commit') or {}).get('author') or {}
+        return cls(raw['sha'], author.get('name'), parse_github_timestamp(author.get('date')))
+
+class ReviewRecord(Record):
+    __slots__ = ('id', 'state', 'author', 'submitted_at')
+
+    @classmethod
+    def from_raw(cls, raw):
+        return cls(raw['id'], raw.get('state'), _login_of(raw.get('user')),
+                   parse_github_timestamp(raw.get('submitted_at')))
+
+class ReviewCommentRecord(Record):
+    __slots__ = ('id', 'author', 'path', 'created_at')
+
+    @classmethod
+    def from_raw(cls, raw):
+        return cls(raw['id'], _login_of(raw.get('user')), raw.get('path'),
+                   parse_github_timestamp(raw.get('created_at')))
+
+class PullRequestRecord(Record):
+    __slots__ = ('number', 'title', 'state', 'author', 'created_at', 'updated_at', 'closed_at', 'merged_at',
+                 'reviews')
+
+    @classmethod
+    def from_raw(cls, raw, reviews=()):
+        return cls(raw['number'], raw.get('title'), raw.get('state'), _login_of(raw.get('user')),
+                   parse_github_timestamp(raw.get('created_at')),
+                   parse_github_timestamp(raw.get('updated_at')),
+                   parse_github_timestamp(raw.get('closed_at')),
+                   parse_github_timestamp(raw.get('merged_at')),
+                   tuple(reviews))
+
+class IssueRecord(Record):
+    __slots__ = ('number', 'title', 'state', 'author', 'created_at', 'updated_at', 'closed_at', 'comments',
+                 'labels', 'is_pull_request')
+
+    @classmethod
+    def from_raw(cls, raw):
+        return cls(raw['number'], raw.get('title'), raw.get('state'), _login_of(raw.get('user')),
+                   parse_github_timestamp(raw.get('created_at')),
+                   parse_github_timestamp(raw.get('updated_at')),
+                   parse_github_timestamp(raw.get('closed_at')),
+                   raw.get('comments', 0),
+                   tuple(label['name'] for label in raw.get('labels') or ()),
+                   'pull_request' in raw)
+
+class ContributorRecord(Record):
+    __slots__ = ('login', 'contributions')
+
+    @classmethod
+    def from_raw(cls, raw):
+        return cls(raw.get('login'), raw.get('contributions', 0))
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from metrics_calculation import CommitCube, GRANULARITIES, calculate_metrics, calculate_metrics_incrementally
+from records import CommitRecord, IssueRecord, PullRequestRecord
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def make_cube():
+    # 10 commits: 3 on 2024-01-15 (a Monday), 4 on 2024-02-20 and 3 on 2024-05-10
+    daily = pd.Series([3, 4, 3], index=pd.to_datetime(['2024-01-15', '2024-02-20', '2024-05-10']))
+    return CommitCube.from_daily(daily)
+
+def test_series_keeps_the_bucket_a_mid_bucket_start_falls_in():
+    cube = make_cube()
+    assert cube.series('week', '2024-01-17').sum() == 10
+    assert cube.series('month', '2024-01-20').sum() == 10
+    assert cube.series('quarter', '2024-02-01', '2024-03-01').sum() == 7
+    assert cube.series('day', '2024-01-15 13:00').sum() == 10
+
+def test_series_start_on_a_bucket_boundary_is_unchanged():
+    cube = make_cube()
+    assert cube.series('month', '2024-02-01').sum() == 7
+    assert cube.series('quarter', '2024-04-01').sum() == 3
+    assert cube.series('day', '2024-01-16').sum() == 7
+
+def day(offset, hours=0):
+    return START + timedelta(days=offset, hours=hours)
+
+def commit(sha, author, offset):
+    return CommitRecord(sha, author, day(offset, 10))
+
+def pull_request(number, state, created, merged=None):
+    merged_at = day(merged) if merged is not None else None
+    return PullRequestRecord(number, f"PR {number}", state, 'alice', day(created), day(created), merged_at, merged_at,
+                             ())
+
+def issue(number, comments, created, closed=None):
+    return IssueRecord(number, f"Issue {number}", 'closed' if closed is not None else 'open', 'bob', day(created),
+                       day(created), day(closed) if closed is not None else None, comments, (), False)
+
+def make_data():
+    return {
+        'commits': [commit('a', 'alice', 0), commit('b', 'bob', 0), commit('c', 'alice', 9), commit('d', None, 40)],
+        'pull_requests': [pull_request(1, 'closed', 0, 3), pull_request(2, 'open', 5), pull_request(4, 'closed', 1)],
+        'issues': [issue(10, 5, 0, 4), issue(11, 2, 1), issue(12, 7, 2, 12)],
+    }
+
+def assert_same_metrics(actual, expected):
+    pd.testing.assert_series_equal(actual['commit_frequency'], expected['commit_frequency'],
+                                   check_names=False, check_freq=False)
+    for granularity in GRANULARITIES:
+        pd.testing.assert_series_equal(actual['commit_cube'].totals[granularity],
+                                       expected['commit_cube'].totals[granularity], check_names=False,
+                                       check_freq=False)
+        pd.testing.assert_series_equal(actual['commit_cube'].by_author[granularity],
+                                       expected['commit_cube'].by_author[granularity])
+    assert actual['commit_cube'].authors == expected['commit_cube'].authors
+    assert actual['contributor_activity'].to_dict() == expected['contributor_activity'].to_dict()
+    assert actual['pr_merge_rate'] == expected['pr_merge_rate']
+    for name in ('issue_resolution_time', 'pr_review_time', 'issue_age'):
+        assert actual[name] == pytest.approx(expected[name])
+    assert actual['top_issues'].values.tolist() == expected['top_issues'].values.tolist()
+    for name in ('commits', 'pull_requests', 'issues'):
+        pd.testing.assert_frame_equal(actual['frames'][name], expected['frames'][name])
+
+def test_incremental_metrics_match_a_full_recalculation():
+    data = make_data()
+    _, state = calculate_metrics_incrementally(dict(data, delta=None))
+
+    # One new item per entity, and updates that have to retract what the old version contributed:
+    # a commit moves to another day and author, one pull request is merged and another reopened, and
+    # an issue is closed and drops down the most commented list
+    new_commit, moved_commit = commit('e', 'carol', 9), commit('b', 'alice', 40)
+    new_pr, merged_pr = pull_request(3, 'closed', 6, 8), pull_request(2, 'closed', 5, 20)
+    reopened_pr = pull_request(4, 'open', 1)
+    new_issue, closed_issue = issue(13, 4, 3), issue(12, 1, 2, 5)
+    data['commits'] = [data['commits'][0], moved_commit] + data['commits'][2:] + [new_commit]
+    data['pull_requests'] = [data['pull_requests'][0], merged_pr, reopened_pr, new_pr]
+    data['issues'] = data['issues'][:2] + [closed_issue, new_issue]
+    delta = {
+        'commits': {'new': [new_commit], 'updated': [moved_commit]},
+        'pull_requests': {'new': [new_pr], 'updated': [merged_pr, reopened_pr]},
+        'issues': {'new': [new_issue], 'updated': [closed_issue]},
+    }
+
+    metrics, _ = calculate_metrics_incrementally(dict(data, delta=delta), state)
+    assert_same_metrics(metrics, calculate_metrics(data))
+
+def test_a_state_that_missed_a_delta_is_rebuilt():
+    data = make_data()
+    _, state = calculate_metrics_incrementally(dict(data, delta=None))
+    data['commits'].append(commit('e', 'carol', 9))
+
+    metrics, _ = calculate_metrics_incrementally(dict(data, delta={'commits': {'new': [], 'updated': []}}), state)
+    assert_same_metrics(metrics, calculate_metrics(data))
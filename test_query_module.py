@@ -0,0 +1,62 @@
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+
+from metrics_calculation import CommitCube, calculate_metrics
+from query_module import QuerySpec, parse_query, run_query
+from records import CommitRecord, IssueRecord, PullRequestRecord
+
+NOW = datetime(2024, 6, 30, 12, tzinfo=timezone.utc)
+
+def make_metrics():
+    start = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    data = {
+        'commits': [CommitRecord(f"{i:040x}", 'alice' if i % 2 else 'bob', start + timedelta(days=i))
+                    for i in range(10)],
+        'pull_requests': [
+            PullRequestRecord(1, "PR 1", 'closed', 'alice', start, start, start + timedelta(days=2),
+                              start + timedelta(days=2), ()),
+            PullRequestRecord(2, "PR 2", 'open', 'bob', start, start, None, None, ()),
+        ],
+        'issues': [
+            IssueRecord(3, "Issue 3", 'closed', 'bob', start, start, start + timedelta(days=4), 5, ('bug',), False),
+            IssueRecord(4, "Issue 4", 'open', 'alice', start, start, None, 2, (), False),
+        ],
+    }
+    return calculate_metrics(data)
+
+def test_parse_query_reads_every_filter():
+    spec = parse_query("commit frequency for Alice last 7 days by week", now=NOW)
+    assert spec == QuerySpec('commit_frequency', 'Alice', pd.Timestamp('2024-06-23', tz='UTC'), None, 'week',
+                             None, None)
+    spec = parse_query("closed issue resolution time labelled bug between 2024-01-01 and 2024-03-31", now=NOW)
+    assert (spec.intent, spec.state, spec.label) == ('issue_resolution_time', 'closed', 'bug')
+    assert (spec.start, spec.end.date().isoformat()) == (pd.Timestamp('2024-01-01', tz='UTC'), '2024-03-31')
+    assert parse_query("number of commits for the last week", now=NOW).author is None
+    assert parse_query("what is the weather", now=NOW).intent is None
+
+def test_run_query_applies_supported_filters():
+    metrics = make_metrics()
+    fig, description = run_query(parse_query("pr merge rate for alice", now=NOW), metrics)
+    assert fig is not None and description == "Pull Request Merge Rate for alice"
+    fig, description = run_query(parse_query("commit frequency for alice by week", now=NOW), metrics)
+    assert fig is not None and description == "Commit Frequency for alice by week"
+
+def test_run_query_refuses_filters_the_metric_does_not_support():
+    metrics = make_metrics()
+    for query, refused in (("pr merge rate labelled bug", "label"), ("contributor activity for bob", "author"),
+                           ("languages last 30 days", "date range")):
+        fig, description = run_query(parse_query(query, now=NOW), metrics)
+        assert fig is None
+        assert f"cannot be filtered by {refused}." in description
+
+def test_run_query_refuses_filters_the_data_cannot_apply():
+    metrics = make_metrics()
+    # Like metrics loaded from a CSV export: no records, and a commit cube without per-author counts
+    del metrics['frames']
+    metrics['commit_cube'] = CommitCube.from_daily(metrics['commit_frequency'])
+    for query, refused in (("commit frequency for alice", "author"), ("issue age labelled bug", "label")):
+        fig, description = run_query(parse_query(query, now=NOW), metrics)
+        assert fig is None
+        assert f"cannot be filtered by {refused} for this data" in description
+    fig, description = run_query(parse_query("commit frequency by week", now=NOW), metrics)
+    assert fig is not None and description == "Commit Frequency by week"